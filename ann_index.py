@@ -0,0 +1,337 @@
+# ann_index.py
+#
+# Optional in-process vector index for read-heavy serving:
+#
+#     python ann_index.py [--shard repo] [--dtype int8|float16] [--lists N]
+#
+# exports the vectors of a Chroma collection into ann_index/ and
+# `"vector_backend": "ann"` in model_config.json makes search_codebase use
+# it instead of a Chroma vector query. Chroma stays the source of truth:
+# documents and metadata are still read from it by id, and the chatbot
+# falls back to Chroma when no index has been exported or when the
+# collection has changed since the export (the index stores a fingerprint
+# of the collection's ids and content hashes). chromaDB.py re-exports an
+# existing index after every sync.
+#
+# Each export is written to its own subdirectory and then made current by
+# atomically replacing ann_index/CURRENT, so a reader never pairs files
+# from two exports.
+#
+# The index is an inverted file (IVF): vectors are clustered with k-means
+# and stored grouped by cluster, so a query only scans the `nprobe`
+# clusters whose centroids are closest. Vectors are L2-normalised and
+# stored as int8 (one float32 scale per vector) or float16, and every
+# array is memory-mapped.
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+
+ANN_INDEX_PATH = "ann_index"
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 12
+# k-means runs on at most this many vectors per list
+KMEANS_SAMPLE = 256
+
+ROW_DTYPE = np.dtype([
+    ("file", "<i4"),
+    ("type", "<i4"),
+])
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def default_lists(count: int) -> int:
+    """About 4·√n inverted lists, as usual for IVF."""
+    return max(1, min(count, int(4 * np.sqrt(count))))
+
+
+def kmeans(vectors: np.ndarray, lists: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids, trained on a sample of the (normalised) vectors."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > lists * KMEANS_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), lists * KMEANS_SAMPLE, replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~np.bincount(assignment, minlength=lists).astype(bool)
+        # An empty list takes a random vector, so no centroid is wasted
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def collection_fingerprint(ids: list, metadatas: list) -> str:
+    """Hash of a collection's (id, content_hash) pairs, independent of their order."""
+    digest = hashlib.sha1()
+    for doc_id, content in sorted(zip(ids, ((m or {}).get("content_hash", "") for m in metadatas))):
+        digest.update(f"{doc_id}\0{content}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint_collection(collection, batch_size: int = 5000) -> str:
+    """collection_fingerprint of a Chroma collection, read in batches."""
+    ids, metadatas = [], []
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids.extend(batch["ids"])
+        metadatas.extend(batch["metadatas"])
+    return collection_fingerprint(ids, metadatas)
+
+
+def _current_dir(path: str):
+    """Directory of the current export under `path`, or None if none has been exported."""
+    try:
+        with open(os.path.join(path, "CURRENT"), "r", encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        pass
+    # Exports written before CURRENT existed sit directly in `path`
+    return path if os.path.exists(os.path.join(path, "index.json")) else None
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch: int = 8192) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(vectors[i:i + batch] @ centroids.T, axis=1) for i in range(0, len(vectors), batch)
+    ])
+
+
+class AnnIndex:
+    """
+    Memory-mapped IVF index (see the module comment).
+
+    - vectors.npy: quantized vectors, grouped by list (scales.npy holds the
+      int8 scale of each row)
+    - centroids.npy, list_offsets.npy: list centroids and row ranges
+    - rows.npy: file and type of each row (interned into strings.json) for
+      pre-filtering; ids.json maps rows back to document ids
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        with open(os.path.join(path, "strings.json"), "r", encoding="utf-8") as f:
+            self.strings = json.load(f)
+        self.string_ids = {value: i for i, value in enumerate(self.strings)}
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.vectors = load("vectors.npy")
+        self.scales = load("scales.npy") if self.info["dtype"] == "int8" else None
+        self.rows = load("rows.npy")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.row_lists = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+
+    @classmethod
+    def open(cls, path: str = ANN_INDEX_PATH):
+        """Open the current export under `path`, or return None if none has been exported."""
+        current = _current_dir(path)
+        return cls(current) if current is not None else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def model_name(self) -> str:
+        return self.info.get("embedding_model")
+
+    @property
+    def fingerprint(self) -> str:
+        return self.info.get("fingerprint")
+
+    @staticmethod
+    def build(ids: list, embeddings, metadatas: list, path: str = ANN_INDEX_PATH, dtype: str = "int8",
+              lists: int = None, embedding_model: str = None) -> dict:
+        """Cluster, quantize and write an index, then make it the current export; returns its info."""
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported dtype '{dtype}' (use int8 or float16)")
+        if not ids:
+            raise ValueError("No vectors to index. Run `python chromaDB.py` first.")
+        os.makedirs(path, exist_ok=True)
+        out = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=path)
+        version = os.path.basename(out)
+        fingerprint = collection_fingerprint(ids, metadatas)
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        lists = min(lists or default_lists(len(ids)), len(ids))
+        centroids = kmeans(vectors, lists)
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+        vectors = vectors[order]
+
+        strings, string_ids = [], {}
+
+        def intern(value: str) -> int:
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        rows = np.array([
+            (intern(metadatas[i].get("file", "")), intern(metadatas[i].get("type", ""))) for i in order
+        ], dtype=ROW_DTYPE)
+
+        arrays = {"centroids": centroids.astype(np.float32), "list_offsets": list_offsets.astype(np.int64), "rows": rows}
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            arrays["vectors"] = np.round(vectors / scales[:, None]).astype(np.int8)
+            arrays["scales"] = scales.astype(np.float32)
+        else:
+            arrays["vectors"] = vectors.astype(np.float16)
+
+        info = {
+            "dtype": dtype,
+            "dim": int(vectors.shape[1]),
+            "count": len(ids),
+            "lists": len(centroids),
+            "embedding_model": embedding_model,
+            "fingerprint": fingerprint,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(out, f"{name}.npy"), array)
+        with open(os.path.join(out, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump([ids[i] for i in order], f)
+        with open(os.path.join(out, "strings.json"), "w", encoding="utf-8") as f:
+            json.dump(strings, f, ensure_ascii=False)
+        with open(os.path.join(out, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+
+        previous = _current_dir(path)
+        tmp_path = os.path.join(path, "CURRENT.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(path, "CURRENT"))
+        # Keep the previous export for readers that are still opening it; older ones go
+        for name in os.listdir(path):
+            old = os.path.join(path, name)
+            if os.path.isdir(old) and name != version and old != previous:
+                shutil.rmtree(old, ignore_errors=True)
+            elif previous == path and name.endswith((".npy", ".json")):
+                os.remove(old)  # flat export from before CURRENT existed
+        return info
+
+    def _allowed(self, where: dict):
+        """Boolean row mask for {"file": value or [values], "type": ...}, or None for no filter."""
+        if not where:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, values in where.items():
+            if field not in ROW_DTYPE.names:
+                raise ValueError(f"Cannot filter on '{field}' (only {', '.join(ROW_DTYPE.names)})")
+            values = [values] if isinstance(values, str) else values
+            wanted = [self.string_ids[v] for v in values if v in self.string_ids]
+            mask &= np.isin(self.rows[field], wanted)
+        return mask
+
+    def _scores(self, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the given rows with each query: shape (rows, queries)."""
+        scores = self.vectors[rows].astype(np.float32) @ queries.T
+        if self.scales is not None:
+            scores *= self.scales[rows][:, None]
+        return scores
+
+    def search(self, query_embeddings, top_k: int = 5, nprobe: int = DEFAULT_NPROBE, where: dict = None) -> list:
+        """
+        [[(id, score), ...] per query], best first.
+
+        Queries are searched together: the union of their probed lists is
+        dequantized once and scored with one matrix product. With `where`,
+        only matching rows are scored. A selective filter that leaves no
+        more rows than `nprobe` lists hold on average is answered by scoring
+        all of them (exact). Otherwise lists without a match are not probed,
+        and more lists are probed if the first `nprobe` hold fewer than
+        `top_k` matching rows.
+        """
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.info["dim"]))
+        allowed = self._allowed(where)
+        probes = None
+        if allowed is not None and allowed.sum() <= nprobe * len(self.ids) / len(self.centroids):
+            rows = np.flatnonzero(allowed)
+        else:
+            if allowed is None:
+                list_sizes = np.diff(self.list_offsets)
+            else:
+                list_sizes = np.bincount(self.row_lists[allowed], minlength=len(self.centroids))
+            probes = []
+            for ranking in np.argsort(-(queries @ self.centroids.T), axis=1):
+                ranking = ranking[list_sizes[ranking] > 0]
+                enough = np.searchsorted(np.cumsum(list_sizes[ranking]), top_k) + 1
+                probes.append(ranking[:max(nprobe, enough)])
+            rows = np.concatenate([
+                np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in np.unique(np.concatenate(probes))
+            ])
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+        if not rows.size:
+            return [[] for _ in queries]  # nothing matches the filter
+        scores = self._scores(rows, queries)
+        row_lists = self.row_lists[rows]
+
+        results = []
+        for q in range(len(queries)):
+            column = scores[:, q] if probes is None else np.where(np.isin(row_lists, probes[q]), scores[:, q], -np.inf)
+            k = min(top_k, int(np.isfinite(column).sum()))
+            best = np.argpartition(-column, k - 1)[:k]
+            best = best[np.argsort(-column[best])]
+            results.append([(self.ids[rows[i]], float(column[i])) for i in best])
+        return results
+
+
+def export_collection(collection, path: str = ANN_INDEX_PATH, dtype: str = "int8", lists: int = None,
+                      batch_size: int = 5000) -> dict:
+    """Copy a Chroma collection's vectors into an AnnIndex at `path`."""
+    ids, embeddings, metadatas = [], [], []
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+        ids.extend(batch["ids"])
+        embeddings.extend(batch["embeddings"])
+        metadatas.extend(batch["metadatas"])
+    return AnnIndex.build(
+        ids, np.asarray(embeddings, dtype=np.float32), metadatas, path, dtype, lists,
+        (collection.metadata or {}).get("embedding_model")
+    )
+
+
+if __name__ == "__main__":
+    import chromadb
+    from shards import CHROMA_PATH, Shard, ShardRegistry
+
+    arg_parser = argparse.ArgumentParser(description="Export a Chroma collection into a quantized ANN index")
+    arg_parser.add_argument("--dtype", choices=("int8", "float16"), default="int8")
+    arg_parser.add_argument("--lists", type=int, help="number of IVF lists (default: about 4·√n)")
+    arg_parser.add_argument("--shard", help="export the collection of a shard registered with shards.py")
+    args = arg_parser.parse_args()
+
+    try:
+        shard = ShardRegistry.load().get(args.shard) if args.shard else Shard()
+    except KeyError as e:
+        sys.exit(f"❌ {e.args[0]}")
+
+    start = time.perf_counter()
+    try:
+        collection = chromadb.PersistentClient(path=CHROMA_PATH).get_collection(shard.collection_name)
+        info = export_collection(collection, shard.ann_index_path, args.dtype, args.lists)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    except Exception:
+        sys.exit(f"❌ No collection '{shard.collection_name}' in {CHROMA_PATH}. Run `python chromaDB.py` first.")
+    current = _current_dir(shard.ann_index_path)
+    size = sum(os.path.getsize(os.path.join(current, name)) for name in os.listdir(current))
+    print(f"✅ Exported {info['count']} vectors ({info['dim']}-d, {info['dtype']}, {info['lists']} lists) "
+          f"to {shard.ann_index_path} in {time.perf_counter() - start:.1f}s, {size / 1e6:.1f} MB")
@@ -0,0 +1,150 @@
+# bench_ann.py
+#
+# Recall and latency of the quantized IVF index against Chroma on the same data:
+#     python bench_ann.py [--docs 20000] [--dim 384] [--queries 200] [--top-k 10]
+#
+# Clustered random vectors (with file/type metadata) are written to a
+# temporary Chroma collection and exported with ann_index.export_collection
+# as int8 and float16. Queries are noisy copies of stored vectors. Recall@k
+# is measured against exact float32 search. Latency is per query, one at a
+# time and in batches, with and without a file filter. Also reports index
+# size on disk and export time.
+
+import os
+import math
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import chromadb
+from ann_index import DEFAULT_NPROBE, AnnIndex, export_collection
+
+TYPES = ("Function", "Class", "Method", "Script")
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))] if ordered else 0.0
+
+
+def make_data(docs: int, dim: int, queries: int, files: int, seed: int = 0) -> tuple:
+    """Normalised vectors around `docs / 50` centres, metadata, and queries near stored vectors."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, docs // 50), dim))
+    vectors = centres[rng.integers(0, len(centres), docs)] + rng.normal(scale=0.8, size=(docs, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    ids = [f"doc{i}" for i in range(docs)]
+    metadatas = [{"file": f"pkg/module_{i % files}.py", "type": TYPES[i % len(TYPES)]} for i in range(docs)]
+    picks = rng.choice(docs, queries, replace=False)
+    query_vectors = vectors[picks] + rng.normal(scale=0.03, size=(queries, dim))
+    query_vectors = (query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)).astype(np.float32)
+    query_files = [metadatas[i]["file"] for i in picks]
+    return ids, vectors, metadatas, query_vectors, query_files
+
+
+def exact_top_k(vectors: np.ndarray, metadatas: list, queries: np.ndarray, top_k: int, files: list = None) -> list:
+    scores = queries @ vectors.T
+    if files is not None:
+        file_of = np.array([m["file"] for m in metadatas])
+        scores = np.where(file_of[None, :] == np.array(files)[:, None], scores, -np.inf)
+    return [set(np.argsort(-row)[:top_k]) for row in scores]
+
+
+def recall(found: list, truth: list, ids: list) -> float:
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+    return float(np.mean([
+        len({position[doc_id] for doc_id in hits} & expected) / max(1, len(expected))
+        for hits, expected in zip(found, truth)
+    ]))
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def time_each(search, queries) -> tuple:
+    """Run `search(i)` for every query; return (results, per-query milliseconds)."""
+    results, latencies = [], []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        results.append(search(i))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def report(name: str, found: list, truth: list, ids: list, latencies: list, batch_ms: float = None):
+    batch = f"{batch_ms:9.3f}" if batch_ms is not None else f"{'-':>9}"
+    print(f"{name:<28} {recall(found, truth, ids):>7.3f} {percentile(latencies, 50):>8.3f} "
+          f"{percentile(latencies, 95):>8.3f} {batch}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the quantized ANN index against Chroma")
+    arg_parser.add_argument("--docs", type=int, default=20000)
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--top-k", type=int, default=10)
+    arg_parser.add_argument("--files", type=int, default=500, help="distinct file values for the filter test")
+    arg_parser.add_argument("--nprobe", type=int, nargs="+", default=[4, DEFAULT_NPROBE, 16])
+    arg_parser.add_argument("--batch", type=int, default=32, help="queries per batched search")
+    args = arg_parser.parse_args()
+
+    ids, vectors, metadatas, queries, query_files = make_data(args.docs, args.dim, args.queries, args.files)
+    truth = exact_top_k(vectors, metadatas, queries, args.top_k)
+    filtered_truth = exact_top_k(vectors, metadatas, queries, args.top_k, query_files)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        chroma_path = os.path.join(workdir, "chroma_db")
+        collection = chromadb.PersistentClient(path=chroma_path).get_or_create_collection("bench")
+        start = time.perf_counter()
+        for i in range(0, args.docs, 5000):
+            collection.add(ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000], metadatas=metadatas[i:i + 5000])
+        print(f"🏗️ Chroma: {args.docs} × {args.dim}-d vectors added in {time.perf_counter() - start:.1f}s, "
+              f"{directory_size(chroma_path) / 1e6:.1f} MB on disk")
+
+        indexes = {}
+        for dtype in ("int8", "float16"):
+            path = os.path.join(workdir, f"ann_{dtype}")
+            start = time.perf_counter()
+            info = export_collection(collection, path, dtype)
+            indexes[dtype] = AnnIndex.open(path)
+            print(f"🏗️ ANN {dtype}: exported in {time.perf_counter() - start:.1f}s, {info['lists']} lists, "
+                  f"{directory_size(path) / 1e6:.1f} MB on disk")
+
+        print(f"\n{'backend (ms per query)':<28} {'recall':>7} {'p50':>8} {'p95':>8} {'batched':>9}")
+        found, latencies = time_each(
+            lambda i: collection.query(query_embeddings=[queries[i]], n_results=args.top_k, include=[])["ids"][0],
+            queries
+        )
+        start = time.perf_counter()
+        for i in range(0, len(queries), args.batch):
+            collection.query(query_embeddings=queries[i:i + args.batch], n_results=args.top_k, include=[])
+        report("chroma", found, truth, ids, latencies, (time.perf_counter() - start) * 1000 / len(queries))
+
+        for dtype, index in indexes.items():
+            for nprobe in args.nprobe:
+                found, latencies = time_each(
+                    lambda i: [doc_id for doc_id, _ in index.search(queries[i], args.top_k, nprobe)[0]], queries
+                )
+                start = time.perf_counter()
+                for i in range(0, len(queries), args.batch):
+                    index.search(queries[i:i + args.batch], args.top_k, nprobe)
+                report(f"ann {dtype} nprobe={nprobe}", found, truth, ids, latencies,
+                       (time.perf_counter() - start) * 1000 / len(queries))
+
+        print(f"\n{'filtered by file':<28} {'recall':>7} {'p50':>8} {'p95':>8}")
+        found, latencies = time_each(
+            lambda i: collection.query(query_embeddings=[queries[i]], n_results=args.top_k,
+                                       where={"file": query_files[i]}, include=[])["ids"][0],
+            queries
+        )
+        report("chroma", found, filtered_truth, ids, latencies)
+        for dtype, index in indexes.items():
+            found, latencies = time_each(
+                lambda i: [doc_id for doc_id, _ in index.search(queries[i], args.top_k, DEFAULT_NPROBE,
+                                                               where={"file": query_files[i]})[0]],
+                queries
+            )
+            report(f"ann {dtype} nprobe={DEFAULT_NPROBE}", found, filtered_truth, ids, latencies)
@@ -0,0 +1,30 @@
+# cli.py
+
+import argparse
+from inventory.storage import load_inventory, save_inventory, import_csv
+from inventory.reports import low_stock_report, valuation_report, ReportPrinter
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory manager")
+    parser.add_argument("command", choices=["report", "import", "value"])
+    parser.add_argument("--path", default="inventory.json")
+    parser.add_argument("--csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point: run one command against the stored inventory."""
+    args = parse_args(argv)
+    if args.command == "import":
+        save_inventory(import_csv(args.csv), args.path)
+        return
+    inventory = load_inventory(args.path)
+    if args.command == "report":
+        ReportPrinter("Low stock").print_lines(low_stock_report(inventory))
+    else:
+        print(valuation_report(inventory))
+
+
+if __name__ == "__main__":
+    main()
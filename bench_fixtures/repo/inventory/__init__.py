@@ -0,0 +1 @@
+from inventory.models import Item, Inventory
@@ -0,0 +1,52 @@
+# inventory/models.py
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Item:
+    """A stock-keeping unit with a unit price and a quantity on hand."""
+    sku: str
+    name: str
+    price: float
+    quantity: int = 0
+    tags: list = field(default_factory=list)
+
+    def is_low_stock(self, threshold: int = 5) -> bool:
+        """True when fewer than `threshold` units are left."""
+        return self.quantity < threshold
+
+
+class InventoryError(Exception):
+    pass
+
+
+class Inventory:
+    """Collection of items indexed by SKU."""
+
+    def __init__(self):
+        self.items = {}
+
+    def add_item(self, item: Item):
+        """Add a new item, or increase the quantity of an existing SKU."""
+        if item.sku in self.items:
+            self.items[item.sku].quantity += item.quantity
+        else:
+            self.items[item.sku] = item
+
+    def remove_item(self, sku: str, quantity: int = 1):
+        """Take `quantity` units out of stock; raises InventoryError if there are not enough."""
+        item = self.items.get(sku)
+        if item is None:
+            raise InventoryError(f"Unknown SKU {sku}")
+        if item.quantity < quantity:
+            raise InventoryError(f"Only {item.quantity} units of {sku} left")
+        item.quantity -= quantity
+
+    def find_by_tag(self, tag: str) -> list:
+        """Items carrying `tag`."""
+        return [item for item in self.items.values() if tag in item.tags]
+
+    def total_value(self) -> float:
+        """Value of everything in stock at list price."""
+        return sum(item.price * item.quantity for item in self.items.values())
@@ -0,0 +1,26 @@
+# inventory/pricing.py
+
+TAX_RATE = 0.2
+
+
+def apply_discount(price: float, percent: float) -> float:
+    """Reduce a price by a percentage, never below zero."""
+    # Discounts over 100% would make the price negative
+    percent = min(max(percent, 0.0), 100.0)
+    return round(price * (1 - percent / 100), 2)
+
+
+def compute_tax(price: float, rate: float = TAX_RATE) -> float:
+    """Sales tax owed on a price."""
+    return round(price * rate, 2)
+
+
+def price_with_tax(price: float, discount: float = 0.0) -> float:
+    """Final shelf price: discount first, then tax."""
+    discounted = apply_discount(price, discount)
+    return round(discounted + compute_tax(discounted), 2)
+
+
+def format_price(amount: float, currency: str = "EUR") -> str:
+    """Render an amount with two decimals and a currency code."""
+    return f"{amount:,.2f} {currency}"
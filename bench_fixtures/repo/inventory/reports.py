@@ -0,0 +1,34 @@
+# inventory/reports.py
+
+from inventory.pricing import format_price, price_with_tax
+
+
+def low_stock_report(inventory, threshold: int = 5) -> list:
+    """Lines describing every item that needs to be re-ordered."""
+    return [
+        f"{item.sku}: {item.name} ({item.quantity} left)"
+        for item in inventory.items.values()
+        if item.is_low_stock(threshold)
+    ]
+
+
+def valuation_report(inventory) -> str:
+    """Total stock value, before and after tax."""
+    net = inventory.total_value()
+    gross = price_with_tax(net)
+    return f"Stock value: {format_price(net)} (incl. tax {format_price(gross)})"
+
+
+class ReportPrinter:
+    """Prints reports to stdout with a title banner."""
+
+    def __init__(self, title: str):
+        self.title = title
+
+    def banner(self) -> str:
+        return f"== {self.title} =="
+
+    def print_lines(self, lines: list):
+        print(self.banner())
+        for line in lines:
+            print(line)
@@ -0,0 +1,35 @@
+# inventory/storage.py
+
+import os
+import json
+from inventory.models import Item, Inventory
+
+
+def save_inventory(inventory: Inventory, path: str):
+    """Write the inventory to a JSON file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump([vars(item) for item in inventory.items.values()], f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_inventory(path: str) -> Inventory:
+    """Read an inventory saved by save_inventory; a missing file gives an empty one."""
+    inventory = Inventory()
+    if not os.path.exists(path):
+        return inventory
+    with open(path, "r", encoding="utf-8") as f:
+        for record in json.load(f):
+            inventory.add_item(Item(**record))
+    return inventory
+
+
+def import_csv(path: str) -> Inventory:
+    """Build an inventory from a CSV export with sku,name,price,quantity columns."""
+    inventory = Inventory()
+    with open(path, "r", encoding="utf-8") as f:
+        next(f)  # header
+        for line in f:
+            sku, name, price, quantity = line.strip().split(",")
+            inventory.add_item(Item(sku, name, float(price), int(quantity)))
+    return inventory
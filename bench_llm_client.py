@@ -0,0 +1,234 @@
+# bench_llm_client.py
+#
+# Exercises llm_client.OllamaClient against a local stub of Ollama's
+# /api/generate, so it runs without a model:
+#     python bench_llm_client.py [--users 16] [--token-delay 0.005]
+#
+# Checks connection reuse, coalescing of identical prompts, priority order
+# under load, retries, timeouts and queue rejection. Prints ✅/❌ per check
+# (exit 1 if any fails), then compares throughput with a naive client that
+# opens a connection per request and neither queues nor coalesces.
+
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from llm_client import BACKGROUND, LLMBusy, LLMTimeout, OllamaClient, at_priority
+
+
+class StubOllama:
+    """
+    Minimal /api/generate: streams `tokens` NDJSON chunks `token_delay`
+    seconds apart over keep-alive HTTP/1.1 (chunked encoding). The first
+    `fail_next` requests get a 503. Records request order, distinct
+    connections and peak concurrency.
+    """
+
+    def __init__(self, tokens: int = 8, token_delay: float = 0.005):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.fail_next = 0
+        self.prompts = []
+        self.connections = set()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.connections.add(self.client_address)
+                    failing = stub.fail_next > 0
+                    stub.fail_next -= failing
+                    if not failing:
+                        stub.prompts.append(payload["prompt"])
+                        stub.active += 1
+                        stub.peak = max(stub.peak, stub.active)
+                if failing:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for i in range(stub.tokens):
+                        time.sleep(stub.token_delay)
+                        self._chunk(json.dumps({"response": f"t{i} ", "done": False}).encode() + b"\n")
+                    self._chunk(json.dumps({"response": "", "done": True}).encode() + b"\n")
+                    self._chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.prompts.clear()
+            self.connections.clear()
+            self.peak = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))] if ordered else 0.0
+
+
+def naive_invoke(url: str, prompt: str) -> str:
+    """One connection per request, no queue, no coalescing (what a fresh client per call does)."""
+    with requests.post(f"{url}/api/generate", json={"model": "stub", "prompt": prompt, "stream": True},
+                       stream=True, headers={"Connection": "close"}) as response:
+        return "".join(json.loads(line).get("response", "") for line in response.iter_lines() if line)
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    return ok
+
+
+def run_checks(stub: StubOllama, users: int) -> bool:
+    ok = True
+
+    client = OllamaClient(stub.url, "stub", max_concurrent=2, retries=0)
+    stub.reset()
+    for i in range(users):
+        client.invoke(f"sequential {i}")
+    ok &= check("keep-alive", len(stub.connections) == 1,
+                f"{users} sequential requests over {len(stub.connections)} connection(s)")
+
+    stub.reset()
+    with ThreadPoolExecutor(users) as pool:
+        answers = list(pool.map(lambda _: client.invoke("same question"), range(users)))
+    ok &= check("coalescing", len(stub.prompts) == 1 and len(set(answers)) == 1,
+                f"{users} identical concurrent prompts → {len(stub.prompts)} model request(s)")
+
+    stub.reset()
+    with ThreadPoolExecutor(users) as pool:
+        list(pool.map(lambda i: client.invoke(f"distinct {i}"), range(users)))
+    ok &= check("concurrency limit", stub.peak <= 2, f"peak {stub.peak} concurrent requests with max_concurrent=2")
+
+    # One slot: background summaries queued first, interactive answers arrive later but run first
+    client = OllamaClient(stub.url, "stub", max_concurrent=1, retries=0)
+    stub.reset()
+    background = at_priority(client, BACKGROUND)
+    threads = [threading.Thread(target=client.invoke, args=("warm-up",))]
+    threads += [threading.Thread(target=background.invoke, args=(f"summary {i}",)) for i in range(3)]
+    threads += [threading.Thread(target=client.invoke, args=(f"answer {i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+        time.sleep(0.002)
+    for t in threads:
+        t.join()
+    order = [p.split()[0] for p in stub.prompts[1:]]
+    ok &= check("priority", order == ["answer"] * 3 + ["summary"] * 3, f"served after the first: {order}")
+
+    client = OllamaClient(stub.url, "stub", retries=2, backoff=0.01)
+    stub.reset()
+    stub.fail_next = 2
+    answer = client.invoke("flaky")
+    ok &= check("retry", answer.startswith("t0"), "two 503 answers, then success")
+
+    stub.reset()
+    stub.fail_next = 5
+    try:
+        client.invoke("down")
+        failed = False
+    except Exception:
+        failed = True
+    stub.fail_next = 0
+    ok &= check("retry limit", failed, "gives up after 1 + 2 attempts")
+
+    saved_delay = stub.token_delay
+    stub.token_delay = 0.2
+    client = OllamaClient(stub.url, "stub", timeout=0.3, retries=0)
+    start = time.perf_counter()
+    try:
+        client.invoke("slow")
+        timed_out = False
+    except LLMTimeout:
+        timed_out = True
+    ok &= check("timeout", timed_out, f"slow answer abandoned after {time.perf_counter() - start:.2f}s")
+
+    client = OllamaClient(stub.url, "stub", max_concurrent=1, max_queue=2, retries=0)
+    rejected = []
+
+    def ask(i):
+        try:
+            client.invoke(f"busy {i}")
+        except LLMBusy:
+            rejected.append(i)
+
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(ask, range(6)))
+    stub.token_delay = saved_delay
+    ok &= check("backpressure", len(rejected) == 3, f"{len(rejected)} of 6 rejected with 1 running and 2 queued")
+    return ok
+
+
+def throughput(stub: StubOllama, users: int, questions: int):
+    """`users` concurrent users asking from a small set of popular questions."""
+    prompts = [f"popular question {i % questions}" for i in range(users * 4)]
+    client = OllamaClient(stub.url, "stub", max_concurrent=4)
+    for name, invoke in (("naive", lambda p: naive_invoke(stub.url, p)), ("pooled", client.invoke)):
+        stub.reset()
+        latencies = []
+
+        def timed(prompt):
+            start = time.perf_counter()
+            invoke(prompt)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(users) as pool:
+            list(pool.map(timed, prompts))
+        seconds = time.perf_counter() - start
+        print(f"{name:>8}: {len(prompts) / seconds:7.1f} answers/s, p50 {percentile(latencies, 50) * 1000:6.1f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:6.1f} ms, {len(stub.prompts)} model requests, "
+              f"{len(stub.connections)} connections, peak {stub.peak} concurrent")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Check and benchmark the Ollama client against a stub server")
+    arg_parser.add_argument("--users", type=int, default=16)
+    arg_parser.add_argument("--questions", type=int, default=4, help="distinct questions in the throughput run")
+    arg_parser.add_argument("--token-delay", type=float, default=0.005)
+    args = arg_parser.parse_args()
+
+    stub = StubOllama(token_delay=args.token_delay)
+    try:
+        ok = run_checks(stub, args.users)
+        print()
+        throughput(stub, args.users, args.questions)
+    finally:
+        stub.close()
+    sys.exit(0 if ok else 1)
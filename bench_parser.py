@@ -0,0 +1,59 @@
+# bench_parser.py
+#
+# Compare parser throughput at 1, 2, 4 and N workers:
+#     python bench_parser.py [repo_dir] [--repeat 3]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from parser import clone_dir, collect_files, run
+
+
+def bench(repo_dir: str, workers: int, repeat: int, chunksize: int) -> float:
+    """Return the best wall-clock time of a full (non-incremental) parse."""
+    best = float("inf")
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(
+                repo_dir,
+                incremental=False,
+                workers=workers,
+                chunksize=chunksize,
+                output_path=os.path.join(tmp, "parsed_code.ndjson"),
+                manifest_path=os.path.join(tmp, "parse_manifest.json"),
+                diff_path=os.path.join(tmp, "parse_diff.json"),
+                call_graph_path=os.path.join(tmp, "call_graph.json"),
+                overview_path=os.path.join(tmp, "codebase_overview.json"),
+                store_path=os.path.join(tmp, "code_store"),
+            )
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark parser.py at several worker counts")
+    arg_parser.add_argument("repo_dir", nargs="?", default=clone_dir)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--chunksize", type=int, default=16)
+    args = arg_parser.parse_args()
+
+    if not os.path.isdir(args.repo_dir):
+        sys.exit(f"❌ {args.repo_dir} does not exist. Run parser.py first or pass a directory.")
+
+    files, _ = collect_files(args.repo_dir)
+    total_bytes = sum(os.path.getsize(f) for f in files)
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    print(f"📂 {len(files)} files, {total_bytes / 1e6:.1f} MB in {args.repo_dir}\n")
+    print(f"{'workers':>8} {'seconds':>9} {'files/s':>9} {'MB/s':>7} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts:
+        elapsed = bench(args.repo_dir, workers, args.repeat, args.chunksize)
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {len(files) / elapsed:>9.1f} "
+              f"{total_bytes / 1e6 / elapsed:>7.2f} {baseline / elapsed:>7.2f}x")
@@ -0,0 +1,261 @@
+# bench_retrieval.py
+#
+# Retrieval quality and latency on a fixed fixture repository:
+#     python bench_retrieval.py [--repeat 3] [--top-k 5]
+#     python bench_retrieval.py --save-baseline          # record bench_fixtures/retrieval_baseline.json
+#     python bench_retrieval.py --baseline               # compare against it (exit 1 on a quality drop)
+#
+# bench_fixtures/repo is parsed and indexed into a temporary directory and the
+# golden queries in bench_fixtures/golden_queries.json are run through the
+# chatbot's retrieval and prompt building. Reports recall@k, MRR, p50/p95
+# latency per stage and index build throughput.
+#
+# By default embeddings and the LLM are deterministic offline stand-ins, so
+# the numbers only move when retrieval code changes. --real-embeddings and
+# --real-llm use the configured models instead.
+
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import tempfile
+
+import chromadb
+import chatbot_langchain as bot
+from parser import collect_files, run as parse_repo
+from chromaDB import CHROMA_PATH, COLLECTION_NAME, sync_collection, build_documents
+from lexical_index import LexicalIndex, LEXICAL_INDEX_PATH, tokenize
+from query_classifier import QueryRouter
+from embeddings import EMBEDDING_MODEL_NAME, get_embedding_model, embedding_dimension, record_collection_model
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+FIXTURE_REPO = os.path.join(FIXTURE_DIR, "repo")
+GOLDEN_PATH = os.path.join(FIXTURE_DIR, "golden_queries.json")
+BASELINE_PATH = os.path.join(FIXTURE_DIR, "retrieval_baseline.json")
+
+STAGES = ("embed", "search", "context", "llm", "total")
+RECALL_AT = (1, 3, 5)
+
+
+class HashingEmbeddings:
+    """Deterministic embedding stand-in: signed token hashing into `dim` buckets, L2-normalised."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model_name = f"bench-hashing-{dim}"
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+class FakeLLM:
+    """Deterministic LLM stand-in: streams `tokens` tokens derived from the prompt."""
+
+    def __init__(self, tokens: int = 64, seconds_per_token: float = 0.0):
+        self.tokens = tokens
+        self.seconds_per_token = seconds_per_token
+
+    def stream(self, prompt: str):
+        seed = hashlib.md5(prompt.encode("utf-8")).hexdigest()
+        for i in range(self.tokens):
+            if self.seconds_per_token:
+                time.sleep(self.seconds_per_token)
+            yield f"{seed[i % len(seed)]}{i} "
+
+    def invoke(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def snippet_qualname(snippet: dict) -> str:
+    symbol = snippet.get("symbol", "")
+    return symbol.split("::")[1] if symbol.count("::") >= 2 else snippet.get("name", "")
+
+
+def build_index(embedder, model_name: str) -> dict:
+    """Parse and index the fixture repo into the current directory; returns throughput stats."""
+    files, _ = collect_files(FIXTURE_REPO)
+
+    start = time.perf_counter()
+    parse_repo(FIXTURE_REPO, incremental=False, workers=1)
+    parse_seconds = time.perf_counter() - start
+
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    record_collection_model(collection, model_name, embedding_dimension(embedder))
+
+    start = time.perf_counter()
+    stats = sync_collection(collection, embedder)
+    LexicalIndex.build(build_documents()).save(LEXICAL_INDEX_PATH)
+    index_seconds = time.perf_counter() - start
+
+    bot.get_chroma_collection.set(collection)
+    return {
+        "files": len(files),
+        "docs": stats["upserted"],
+        "parse_files_per_sec": round(len(files) / parse_seconds, 1),
+        "index_docs_per_sec": round(stats["upserted"] / index_seconds, 1)
+    }
+
+
+def run_queries(golden: list, top_k: int, repeat: int) -> tuple:
+    """Return (per-query results, {stage: [seconds]}) for the golden set."""
+    timings = {stage: [] for stage in STAGES}
+    results = []
+
+    for case in golden:
+        query = case["query"]
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            embedding = bot.get_query_embedder().embed_query(query)
+            t1 = time.perf_counter()
+            snippets = bot.search_codebase(query, top_k=top_k, query_embedding=embedding)
+            t2 = time.perf_counter()
+            prompt, _ = bot.build_prompt(query, query_embedding=embedding)
+            t3 = time.perf_counter()
+            bot.generate_response(prompt)
+            t4 = time.perf_counter()
+            for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+                timings[stage].append(seconds)
+
+        found = [snippet_qualname(s) for s in snippets]
+        rank = next((i + 1 for i, name in enumerate(found) if name in case["expected"]), None)
+        results.append({"query": query, "expected": case["expected"], "found": found, "rank": rank})
+    return results, timings
+
+
+def summarize(results: list, timings: dict, index_stats: dict, settings: dict) -> dict:
+    scored = [r for r in results if r["expected"]]
+    quality = {
+        f"recall@{k}": round(sum(
+            len(set(r["expected"]) & set(r["found"][:k])) / len(r["expected"]) for r in scored
+        ) / len(scored), 4)
+        for k in RECALL_AT if k <= settings["top_k"]
+    }
+    quality["mrr"] = round(sum(1 / r["rank"] if r["rank"] else 0.0 for r in scored) / len(scored), 4)
+    latency = {
+        stage: {"p50": round(percentile(values, 50) * 1000, 2), "p95": round(percentile(values, 95) * 1000, 2)}
+        for stage, values in timings.items()
+    }
+    return {"settings": settings, "quality": quality, "latency_ms": latency, "index": index_stats, "queries": results}
+
+
+def print_report(report: dict):
+    print("\n🎯 Quality: " + ", ".join(f"{name}={value:.3f}" for name, value in report["quality"].items()))
+    print(f"\n{'stage':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, values in report["latency_ms"].items():
+        print(f"{stage:>8} {values['p50']:>9.2f} {values['p95']:>9.2f}")
+    index = report["index"]
+    print(f"\n🏗️ Index build: {index['files']} files at {index['parse_files_per_sec']} files/s, "
+          f"{index['docs']} docs at {index['index_docs_per_sec']} docs/s")
+    misses = [r for r in report["queries"] if r["expected"] and r["rank"] != 1]
+    for r in misses:
+        print(f"   ⚠️ '{r['query']}' → rank {r['rank'] or '-'} (expected {', '.join(r['expected'])})")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the change against a saved baseline; return False if a quality metric dropped by more than `tolerance`."""
+    if baseline["settings"] != report["settings"]:
+        print(f"⚠️ Baseline settings differ: {baseline['settings']}")
+
+    ok = True
+    print("\n📊 Against baseline:")
+    for name, value in report["quality"].items():
+        before = baseline["quality"].get(name)
+        if before is None:
+            continue
+        delta = value - before
+        regressed = delta < -tolerance
+        ok = ok and not regressed
+        print(f"   {name:>11}: {before:.3f} → {value:.3f} ({delta:+.3f}){'  ❌' if regressed else ''}")
+    for stage, values in report["latency_ms"].items():
+        before = baseline["latency_ms"].get(stage, {}).get("p95")
+        if before:
+            print(f"   {stage + ' p95':>11}: {before:.2f} → {values['p95']:.2f} ms ({(values['p95'] / before - 1) * 100:+.0f}%)")
+
+    previous = {r["query"]: r["rank"] for r in baseline["queries"]}
+    for r in report["queries"]:
+        before, after = previous.get(r["query"]), r["rank"]
+        if r["query"] in previous and before != after:
+            print(f"   {'📉' if (after or 99) > (before or 99) else '📈'} '{r['query']}': rank {before or '-'} → {after or '-'}")
+    return ok
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency on the fixture repo")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per query for the latency percentiles")
+    arg_parser.add_argument("--top-k", type=int, default=5)
+    arg_parser.add_argument("--real-embeddings", action="store_true", help="use the configured embedding model")
+    arg_parser.add_argument("--real-llm", action="store_true", help="use the configured Ollama model")
+    arg_parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH, help="compare against a saved report")
+    arg_parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="save this report as the baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.0, help="allowed drop in recall/MRR before failing")
+    args = arg_parser.parse_args()
+
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    if args.real_embeddings:
+        embedder, model_name = get_embedding_model(use_cache=False), EMBEDDING_MODEL_NAME
+    else:
+        embedder = HashingEmbeddings()
+        model_name = embedder.model_name
+    bot.get_query_embedder.set(embedder)
+    bot.get_router.set(QueryRouter.train(embedder, model_name))
+    if not args.real_llm:
+        bot.get_llm.set(FakeLLM())
+
+    settings = {
+        "embeddings": model_name,
+        "llm": bot.config["model_name"] if args.real_llm else "fake",
+        "top_k": args.top_k,
+        "queries": len(golden)
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Every artifact (parse output, Chroma, indexes, query log) goes to the temp dir
+        os.chdir(workdir)
+        try:
+            index_stats = build_index(embedder, model_name)
+            results, timings = run_queries(golden, args.top_k, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    report = summarize(results, timings, index_stats, settings)
+    print_report(report)
+
+    ok = True
+    if args.baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                ok = compare(report, json.load(f), args.tolerance)
+        else:
+            print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline first.")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,116 @@
+# bench_router.py
+#
+# Routing accuracy and the latency each route saves, on the fixture repository:
+#     python bench_router.py [--repeat 5] [--real-embeddings]
+#
+# The labeled questions in bench_fixtures/router_queries.json are routed by
+# the embedding router and by the old keyword classifier. For each route the
+# prompt is then built twice, once along the chosen route and once with
+# plain hybrid retrieval, to show what skipping the vector query (or
+# retrieval altogether) saves. Uses the offline stand-ins from
+# bench_retrieval.py unless --real-embeddings is given.
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import chatbot_langchain as bot
+from bench_retrieval import FIXTURE_DIR, HashingEmbeddings, build_index, percentile
+from embeddings import EMBEDDING_MODEL_NAME, get_embedding_model
+from query_classifier import FALLBACK_ROUTE, MIN_MARGIN, MIN_SIMILARITY, QueryRouter, classify_query
+
+LABELED_PATH = os.path.join(FIXTURE_DIR, "router_queries.json")
+
+
+def evaluate(labeled: list, embedder, router: QueryRouter, repeat: int) -> list:
+    """Route every question and time the routed prompt against the hybrid one."""
+    results = []
+    for case in labeled:
+        query = case["query"]
+        embedding = embedder.embed_query(query)
+        route_seconds, routed_seconds, hybrid_seconds = [], [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            route, confidence = router.route(query, embedding)
+            t1 = time.perf_counter()
+            bot.build_prompt(query, query_embedding=embedding, route=route)
+            t2 = time.perf_counter()
+            bot.build_prompt(query, query_embedding=embedding, route=FALLBACK_ROUTE)
+            t3 = time.perf_counter()
+            route_seconds.append(t1 - t0)
+            routed_seconds.append(t2 - t1)
+            hybrid_seconds.append(t3 - t2)
+        results.append({
+            "query": query,
+            "expected": case["route"],
+            "route": route,
+            "confidence": round(confidence, 3),
+            "keyword": classify_query(query),
+            "route_seconds": route_seconds,
+            "routed_seconds": routed_seconds,
+            "hybrid_seconds": hybrid_seconds
+        })
+    return results
+
+
+def print_report(results: list, routes: list):
+    accuracy = sum(r["route"] == r["expected"] for r in results) / len(results)
+    keyword = sum(r["keyword"] == r["expected"] for r in results) / len(results)
+    fallbacks = sum(r["route"] == FALLBACK_ROUTE and r["expected"] != FALLBACK_ROUTE for r in results)
+    route_us = [s * 1e6 for r in results for s in r["route_seconds"]]
+    print(f"\n🎯 Routing accuracy: router {accuracy:.3f}, keywords {keyword:.3f} ({len(results)} questions)")
+    print(f"   {fallbacks} fell back to hybrid retrieval; routing took "
+          f"p50 {percentile(route_us, 50):.1f} µs, p95 {percentile(route_us, 95):.1f} µs")
+
+    print(f"\n{'route':>11} {'precision':>9} {'recall':>7} {'queries':>7} {'routed ms':>9} {'hybrid ms':>9} {'saved ms':>8}")
+    for route in routes:
+        expected = [r for r in results if r["expected"] == route]
+        predicted = [r for r in results if r["route"] == route]
+        correct = sum(r["route"] == route for r in expected)
+        routed = [s * 1000 for r in predicted for s in r["routed_seconds"]]
+        hybrid = [s * 1000 for r in predicted for s in r["hybrid_seconds"]]
+        precision = correct / len(predicted) if predicted else 0.0
+        recall = correct / len(expected) if expected else 0.0
+        routed_p50, hybrid_p50 = percentile(routed, 50), percentile(hybrid, 50)
+        print(f"{route:>11} {precision:>9.3f} {recall:>7.3f} {len(predicted):>7} "
+              f"{routed_p50:>9.2f} {hybrid_p50:>9.2f} {hybrid_p50 - routed_p50:>8.2f}")
+
+    for r in results:
+        if r["route"] != r["expected"]:
+            print(f"   ⚠️ '{r['query']}' → {r['route']} ({r['confidence']:.2f}), expected {r['expected']}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark query routing on the fixture repo")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="runs per question for the latency percentiles")
+    arg_parser.add_argument("--real-embeddings", action="store_true", help="use the configured embedding model")
+    arg_parser.add_argument("--min-similarity", type=float, default=MIN_SIMILARITY)
+    arg_parser.add_argument("--min-margin", type=float, default=MIN_MARGIN)
+    args = arg_parser.parse_args()
+
+    with open(LABELED_PATH, "r", encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    if args.real_embeddings:
+        embedder, model_name = get_embedding_model(use_cache=False), EMBEDDING_MODEL_NAME
+    else:
+        embedder = HashingEmbeddings()
+        model_name = embedder.model_name
+    bot.get_query_embedder.set(embedder)
+
+    router = QueryRouter.train(embedder, model_name)
+    router.min_similarity, router.min_margin = args.min_similarity, args.min_margin
+    bot.get_router.set(router)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            build_index(embedder, model_name)
+            results = evaluate(labeled, embedder, router, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    print_report(results, router.routes)
@@ -0,0 +1,93 @@
+# bench_startup.py
+#
+# Cold start (new process per question) vs. warm start (running server):
+#     python bench_startup.py ["question"] [--runs 3]
+#
+# Needs parser.py/chromaDB.py to have been run and Ollama to be reachable.
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+
+PORT = 8799
+SERVER_URL = f"http://127.0.0.1:{PORT}"
+
+COLD_SCRIPT = """
+import time, json
+start = time.perf_counter()
+import chatbot_langchain as bot
+imported = time.perf_counter()
+response, metrics = bot.ask_codebuddy({query!r}, None, [], None, use_cache=False)
+print(json.dumps({{"import": imported - start, "answer": time.perf_counter() - start}}))
+"""
+
+
+def cold_run(query: str) -> dict:
+    """Time a fresh interpreter importing the chatbot and answering one question."""
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_SCRIPT.format(query=query)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+
+def warm_run(query: str) -> float:
+    """Time one question through the running server."""
+    request = urllib.request.Request(
+        f"{SERVER_URL}/ask",
+        data=json.dumps({"query": query, "project_id": "bench_startup", "use_cache": False}).encode(),
+        headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=600) as resp:
+        for _ in resp:
+            pass
+    return time.perf_counter() - start
+
+
+def wait_for_server(timeout: float = 300) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f"{SERVER_URL}/health", timeout=1):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.25)
+    raise TimeoutError("server did not come up")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark cold vs. warm CodeBuddy start-up")
+    arg_parser.add_argument("query", nargs="?", default="What does the main function do?")
+    arg_parser.add_argument("--runs", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cold = [cold_run(args.query) for _ in range(args.runs)]
+    print("🧊 Cold start (new process per question):")
+    for key in ("import", "answer", "process"):
+        values = sorted(run[key] for run in cold)
+        print(f"   {key:>8}: median {values[len(values) // 2]:.2f}s")
+
+    server = subprocess.Popen(
+        [sys.executable, "codebuddy_server.py", "--port", str(PORT)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    try:
+        ready = wait_for_server()
+        warm_run(args.query)  # first request opens the session
+        warm = sorted(warm_run(args.query) for _ in range(args.runs))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"🔥 Warm start (server, ready after {ready:.2f}s):")
+    print(f"   {'answer':>8}: median {warm[len(warm) // 2]:.2f}s")
+    cold_answer = sorted(run["process"] for run in cold)[len(cold) // 2]
+    print(f"⚡ Warm is {cold_answer / warm[len(warm) // 2]:.1f}x faster end to end.")
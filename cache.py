@@ -2,26 +2,220 @@
 
 import os
 import json
+import time
+import sqlite3
 import hashlib
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_STORED = 5000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_SEMANTIC_THRESHOLD = 0.92
 
 def get_cache_path(project_id: str) -> str:
     """Get cache file path for the current project."""
     cache_dir = os.path.join(os.path.expanduser("~"), ".codebuddy_cache")
     os.makedirs(cache_dir, exist_ok=True)
-    return os.path.join(cache_dir, f"cache_{project_id}.json")
-
-def load_cache(cache_path: str) -> dict:
-    """Load cached responses from disk."""
-    if os.path.exists(cache_path):
-        with open(cache_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_cache(cache_path: str, cache: dict):
-    """Save updated cache to disk."""
-    with open(cache_path, "w", encoding="utf-8") as f:
-        json.dump(cache, f, indent=2)
+    return os.path.join(cache_dir, f"cache_{project_id}.sqlite")
 
 def get_query_key(query: str) -> str:
     """Generate a unique hash key for each query string."""
     return hashlib.md5(query.strip().lower().encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache.
+
+    - A bounded in-memory LRU (OrderedDict) in front of a SQLite table, so
+      a write is one INSERT instead of rewriting the whole cache file.
+    - Entries expire after `ttl_seconds`.
+    - With `semantic_threshold`, a query with no exact match returns the
+      answer of the most similar cached query if their embeddings' cosine
+      similarity is at least the threshold.
+    - Each entry remembers the chunks it was answered from ({id: content_hash});
+      `get` drops the entry when the `validate` callback reports they changed.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, semantic_threshold: float = None,
+                 max_stored: int = DEFAULT_MAX_STORED):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.max_stored = max_stored
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            query TEXT,
+            response TEXT,
+            embedding BLOB,
+            chunks TEXT,
+            created REAL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        self.db.commit()
+
+        self._semantic_keys = []
+        self._semantic_matrix = None
+        if semantic_threshold is not None:
+            self._load_semantic_index()
+
+    def _load_semantic_index(self):
+        """Load normalized query embeddings of live entries for similarity lookup."""
+        rows = self.db.execute(
+            "SELECT key, embedding FROM responses WHERE embedding IS NOT NULL AND created > ? "
+            "ORDER BY created DESC LIMIT ?",
+            (time.time() - self.ttl_seconds, self.max_stored)
+        ).fetchall()
+        self._semantic_keys = [key for key, _ in rows]
+        if rows:
+            self._semantic_matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+        else:
+            self._semantic_matrix = None
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["created"] > self.ttl_seconds
+
+    def _remember(self, key: str, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _load(self, key: str):
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry
+
+        row = self.db.execute(
+            "SELECT query, response, chunks, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = {"query": row[0], "response": row[1], "chunks": json.loads(row[2] or "{}"), "created": row[3]}
+        self._remember(key, entry)
+        return entry
+
+    def _nearest(self, query_embedding):
+        """Return the key of the most similar cached query above the threshold."""
+        if self._semantic_matrix is None or query_embedding is None:
+            return None
+        q = _normalize(query_embedding)
+        scores = self._semantic_matrix @ q
+        best = int(np.argmax(scores))
+        if scores[best] >= self.semantic_threshold:
+            return self._semantic_keys[best]
+        return None
+
+    def get(self, query: str, query_embedding=None, validate=None):
+        """
+        Return a cached response or None.
+
+        `validate(chunks)` is called with the stored {id: content_hash}
+        map and should return False if any of those chunks changed.
+        """
+        candidates = [get_query_key(query)]
+        if self.semantic_threshold is not None:
+            nearest = self._nearest(query_embedding)
+            if nearest and nearest != candidates[0]:
+                candidates.append(nearest)
+
+        for i, key in enumerate(candidates):
+            entry = self._load(key)
+            if entry is None:
+                continue
+            if self._expired(entry) or (validate and entry["chunks"] and not validate(entry["chunks"])):
+                self.invalidate(key)
+                continue
+            if i == 0:
+                self.hits += 1
+            else:
+                self.semantic_hits += 1
+            return entry["response"]
+
+        self.misses += 1
+        return None
+
+    def set(self, query: str, response: str, query_embedding=None, chunks: dict = None):
+        key = get_query_key(query)
+        entry = {"query": query, "response": response, "chunks": chunks or {}, "created": time.time()}
+        blob = None
+        if query_embedding is not None:
+            blob = _normalize(query_embedding).tobytes()
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, response, blob, json.dumps(entry["chunks"]), entry["created"])
+            )
+        self._remember(key, entry)
+
+        if blob is not None and self.semantic_threshold is not None:
+            vector = np.frombuffer(blob, dtype=np.float32)[None, :]
+            if key in self._semantic_keys:
+                self._semantic_matrix[self._semantic_keys.index(key)] = vector
+            else:
+                self._semantic_keys.append(key)
+                self._semantic_matrix = vector if self._semantic_matrix is None else np.vstack([self._semantic_matrix, vector])
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def invalidate(self, key: str):
+        self.memory.pop(key, None)
+        with self.db:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        if key in self._semantic_keys:
+            i = self._semantic_keys.index(key)
+            del self._semantic_keys[i]
+            self._semantic_matrix = np.delete(self._semantic_matrix, i, axis=0)
+            if not self._semantic_keys:
+                self._semantic_matrix = None
+
+    def prune(self):
+        """Drop expired entries and keep at most `max_stored` rows on disk."""
+        with self.db:
+            self.db.execute("DELETE FROM responses WHERE created <= ?", (time.time() - self.ttl_seconds,))
+            self.db.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)", (self.max_stored,)
+            )
+        if self.semantic_threshold is not None:
+            self._load_semantic_index()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses}
+
+    def close(self):
+        self.db.close()
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def load_cache(project_id: str, **kwargs) -> ResponseCache:
+    """Open the response cache for a project."""
+    return ResponseCache(get_cache_path(project_id), **kwargs)
+
+def get_cached_response(cache: ResponseCache, query: str, query_embedding=None, validate=None):
+    """Return a cached response for the query (or a close paraphrase), if any."""
+    return cache.get(query, query_embedding=query_embedding, validate=validate)
+
+def set_cached_response(cache: ResponseCache, query: str, response: str, query_embedding=None, chunks: dict = None):
+    """Store a response along with the chunks it was built from."""
+    cache.set(query, response, query_embedding=query_embedding, chunks=chunks)
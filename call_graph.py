@@ -0,0 +1,147 @@
+# call_graph.py
+
+import os
+import json
+from array import array
+from collections import defaultdict, deque
+from symbols import iter_symbols, short_name
+
+CALL_GRAPH_PATH = "call_graph.json"
+
+
+def _to_csr(edges: dict, count: int) -> tuple:
+    """Turn {source: set(targets)} into compact (offsets, targets) int arrays."""
+    offsets = array("i", [0])
+    targets = array("i")
+    for source in range(count):
+        targets.extend(sorted(edges.get(source, ())))
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+class CallGraph:
+    """
+    Caller/callee graph between parsed symbols.
+
+    Symbols are interned to integer ids (their position in `symbols`, which
+    holds the same keys as the vector store) and edges are kept as CSR
+    adjacency arrays in both directions, so a neighbour lookup is one slice.
+    """
+
+    def __init__(self, symbols, callee_offsets, callee_targets, caller_offsets, caller_targets):
+        self.symbols = symbols
+        self.index = {key: i for i, key in enumerate(symbols)}
+        self.callees = (callee_offsets, callee_targets)
+        self.callers = (caller_offsets, caller_targets)
+
+    @classmethod
+    def build(cls, parsed_files) -> "CallGraph":
+        """
+        Build from (file_path, details) pairs as produced by the parser.
+
+        A bare call `f()` resolves to, in order: a module-level function or
+        class named `f` in the same file, `f` in the module it was imported from, or the only
+        top-level `f` in the repository. Anything else (builtins, ambiguous
+        names) is left out.
+        """
+        symbols = []
+        pending_calls = []             # (caller id, file, [names], imported_functions)
+        by_file = defaultdict(dict)    # file -> {name: id}
+        top_level = defaultdict(list)  # name -> [ids]
+
+        for file_path, details in parsed_files:
+            for key, item in iter_symbols(file_path, details):
+                symbol = len(symbols)
+                symbols.append(key)
+                if item.get("type") not in ("Function", "Class"):
+                    continue
+                qualname = short_name(item)
+                name = qualname.rsplit(".", 1)[-1]
+                # Only module-level functions and classes can be reached by a bare name;
+                # methods would otherwise catch builtins like open() or len()
+                if qualname == name:
+                    by_file[file_path][name] = symbol
+                    top_level[name].append(symbol)
+                if item.get("calls"):
+                    pending_calls.append((symbol, file_path, item["calls"], details.get("imported_functions", {})))
+
+        # Every dotted suffix of a file's path is a module name it may be imported as
+        # ("pkg/sub/mod.py" -> "mod", "sub.mod", "pkg.sub.mod"); the first file wins.
+        module_files = {}
+        for file_path in by_file:
+            parts = file_path[:-3].replace(os.sep, "/").split("/")
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            for i in range(len(parts)):
+                module_files.setdefault(".".join(parts[i:]), file_path)
+
+        edges = defaultdict(set)
+        for caller, file_path, calls, imported in pending_calls:
+            for name in set(calls):
+                target = by_file[file_path].get(name)
+                if target is None and name in imported:
+                    source_file = module_files.get(imported[name])
+                    if source_file:
+                        target = by_file[source_file].get(name)
+                if target is None and len(top_level.get(name, ())) == 1:
+                    target = top_level[name][0]
+                if target is not None and target != caller:
+                    edges[caller].add(target)
+
+        reverse = defaultdict(set)
+        for caller, targets in edges.items():
+            for target in targets:
+                reverse[target].add(caller)
+
+        return cls(symbols, *_to_csr(edges, len(symbols)), *_to_csr(reverse, len(symbols)))
+
+    def neighbours(self, symbol: int, direction: str = "callees") -> array:
+        offsets, targets = self.callees if direction == "callees" else self.callers
+        return targets[offsets[symbol]:offsets[symbol + 1]]
+
+    def expand(self, seed_keys: list, hops: int = 1, direction: str = "callees") -> list:
+        """
+        Breadth-first expansion from `seed_keys`; returns [(key, hop, from_key)]
+        for newly reached symbols, nearest first. direction is "callees",
+        "callers" or "both".
+        """
+        directions = ["callees", "callers"] if direction == "both" else [direction]
+        seen = {self.index[key] for key in seed_keys if key in self.index}
+        queue = deque((symbol, 0) for symbol in list(seen))
+        reached = []
+
+        while queue:
+            symbol, hop = queue.popleft()
+            if hop >= hops:
+                continue
+            for d in directions:
+                for neighbour in self.neighbours(symbol, d):
+                    if neighbour in seen:
+                        continue
+                    seen.add(neighbour)
+                    reached.append((self.symbols[neighbour], hop + 1, self.symbols[symbol]))
+                    queue.append((neighbour, hop + 1))
+        return reached
+
+    def save(self, path: str = CALL_GRAPH_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "symbols": self.symbols,
+                "callees": {"offsets": self.callees[0].tolist(), "targets": self.callees[1].tolist()},
+                "callers": {"offsets": self.callers[0].tolist(), "targets": self.callers[1].tolist()}
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = CALL_GRAPH_PATH):
+        """Load the graph, or return None if the parser has not written one."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["symbols"],
+            array("i", data["callees"]["offsets"]), array("i", data["callees"]["targets"]),
+            array("i", data["callers"]["offsets"]), array("i", data["callers"]["targets"])
+        )
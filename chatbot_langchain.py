@@ -1,31 +1,41 @@
 # file: chatbot.py
 
+import os
+import sys
 import json
-import datetime
-import chromadb
-from langchain_community.llms import Ollama
-from langchain_huggingface import HuggingFaceEmbeddings
-from summary_generator import generate_codebase_summary
-from query_classifier import classify_query
+import time
+import threading
+import hashlib
+import functools
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+import telemetry
+from code_store import CodeStore
+from shards import CHROMA_PATH, Shard, ShardRegistry
+from embeddings import EMBEDDING_MODEL_NAME, get_embedding_model, check_collection_model
+from summary_generator import generate_codebase_summary, load_overview, render_overview
+from query_classifier import ROUTER_PATH, QueryRouter, classify_query
 from history import (
+    DEFAULT_MAX_TURNS,
+    HistoryStore,
     get_project_id,
     get_history_path,
-    load_chat_history,
-    save_chat_history,
-    append_message,
-    delete_chat_history
+    load_chat_history
 )
 from cache import (
     load_cache,
-    save_cache,
     get_cached_response,
     set_cached_response
 )
-from context_builder import summarize_history, format_recent_turns
-
-# Load parsed codebase
-with open("parsed_code.json", "r", encoding="utf-8") as f:
-    parsed_data = json.load(f)
+from pipeline import run_stages
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from call_graph import CallGraph
+from symbols import symbol_id
+from context_builder import RollingSummarizer, build_memory_context
+from context_packer import get_token_counter, format_snippet, pack_context
+from chunker import merge_siblings
+from ann_index import DEFAULT_NPROBE, AnnIndex, fingerprint_collection
+from llm_client import BACKGROUND, LLMBusy, OllamaClient, at_priority
 
 # Load model config
 try:
@@ -42,78 +52,523 @@ except FileNotFoundError:
 
 print(f"✅ Using Ollama model: {config['model_name']}")
 
-# Initialize Ollama LLM
-llm = Ollama(
-    model=config["model_name"],
-    temperature=config["temperature"],
-    base_url=config["ollama_host"]
+telemetry.configure(
+    path=config.get("metrics_path", telemetry.METRICS_PATH),
+    sample_rate=config.get("metrics_sample_rate", 1.0),
+    enabled=config.get("metrics_enabled", True)
 )
 
-# Initialize ChromaDB
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-chroma_collection = chroma_client.get_or_create_collection(name="codebase")
+# Heavy resources are created on first use, so the prompt appears right
+# away and e.g. an overview question never loads the embedding model.
+_init_lock = threading.RLock()
 
-# Initialize embeddings
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def lazy(factory):
+    """Run `factory` once, on first call, and return the same object afterwards."""
+    value = []
 
-# Function to log each query
-def log_query(query: str, results: list):
-    with open("query_log.txt", "a", encoding="utf-8") as log:
-        log.write(f"{datetime.datetime.now()} :: '{query}' → {len(results)} results\n")
+    @functools.wraps(factory)
+    def get():
+        if not value:
+            with _init_lock:
+                if not value:
+                    value.append(factory())
+        return value[0]
 
-# Search ChromaDB for code snippets
-def search_codebase(query: str, top_k: int = 5):
-    query_embedding = embedding_model.embed_query(query)
-    search_results = chroma_collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=["metadatas", "documents"]
-    )
+    def set(obj):
+        """Use `obj` instead of calling the factory (e.g. a stand-in for benchmarks)."""
+        with _init_lock:
+            value[:] = [obj]
 
-    if not search_results["ids"][0]:
-        return []
+    get.loaded = lambda: bool(value)
+    get.set = set
+    return get
+
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def per_shard(factory=None, watch=None, release=None):
+    """
+    Like `lazy`, but `factory(shard)` runs once per shard name (None is the default index).
+
+    With `watch(shard) -> path`, the value is rebuilt when that file changes,
+    e.g. after parser.py or chromaDB.py re-indexed while the server runs.
+    The file is checked at most every `reload_check_seconds`, and
+    `release(old_value)` frees what the replaced value held.
+    """
+    if factory is None:
+        return lambda f: per_shard(f, watch, release)
+    values = {}
+    states = {}  # shard -> [Shard, file signature at load, last check]
+    locks = {}
+
+    def stale(shard: str, force: bool = False) -> bool:
+        state = states.get(shard)
+        if state is None:
+            return False  # not watched, or pinned with set()
+        now = time.monotonic()
+        if not force and now - state[2] < config.get("reload_check_seconds", 1.0):
+            return False
+        state[2] = now
+        return _file_signature(watch(state[0])) != state[1]
+
+    @functools.wraps(factory)
+    def get(shard: str = None):
+        if shard in values and not stale(shard):
+            return values[shard]
+        # One lock per shard, so a fan-out does not load the shards one after another
+        with _init_lock:
+            lock = locks.setdefault(shard, threading.RLock())
+        with lock:
+            if shard not in values or stale(shard, force=True):
+                if shard in values:
+                    telemetry.inc("reloads_total", resource=factory.__name__)
+                    print(f"🔄 {factory.__name__}({shard or 'default'}): index files changed, reloading.")
+                shard_obj = get_shard(shard)
+                # Signature before loading, so a change made during the load is picked up next time
+                signature = _file_signature(watch(shard_obj)) if watch else None
+                old = values.get(shard)
+                values[shard] = factory(shard_obj)
+                if watch:
+                    states[shard] = [shard_obj, signature, time.monotonic()]
+                if release is not None and old is not None:
+                    release(old)
+        return values[shard]
+
+    def set(obj, shard: str = None):
+        with _init_lock:
+            values[shard] = obj
+            states.pop(shard, None)
+
+    get.loaded = lambda shard=None: shard in values
+    get.set = set
+    return get
+
+def get_shard(name: str = None) -> Shard:
+    return ShardRegistry.load().get(name) if name else Shard()
+
+def resolve_shards(names) -> list:
+    """Validated shard names for a selection ("a,b", ["a"], "all"); [] means the default index."""
+    return ShardRegistry.load().resolve(names)
+
+@per_shard(watch=lambda shard: os.path.join(shard.store_path, "store.json"), release=CodeStore.close)
+def get_code_store(shard: Shard):
+    """Memory-mapped symbol store written by parser.py (None until it has been run)."""
+    return CodeStore.open(shard.store_path)
+
+def get_parsed_data() -> dict:
+    """Symbol listing without code, for the fallback overview."""
+    store = get_code_store()
+    if store is None:
+        return {"README": "", "parsed_code": {}}
+    return {"README": store.readme(), "parsed_code": dict(store.iter_files(with_code=False))}
+
+@lazy
+def get_llm():
+    """One pooled, queued Ollama client shared by every session in the process."""
+    return OllamaClient(
+        config["ollama_host"],
+        config["model_name"],
+        temperature=config["temperature"],
+        max_tokens=config.get("max_tokens"),
+        max_concurrent=config.get("llm_max_concurrent", 2),
+        max_queue=config.get("llm_max_queue", 32),
+        queue_timeout=config.get("llm_queue_timeout", 120),
+        timeout=config.get("llm_timeout", 300),
+        retries=config.get("llm_retries", 2)
+    )
 
+# chromaDB.py rewrites the lexical index after every sync (a --rebuild recreates the collection)
+@per_shard(watch=lambda shard: shard.lexical_index_path)
+def get_chroma_collection(shard: Shard):
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    collection = chroma_client.get_or_create_collection(name=shard.collection_name)
+    # Refuse to query vectors built with a different embedding model
+    check_collection_model(collection, EMBEDDING_MODEL_NAME)
+    return collection
+
+@per_shard(watch=lambda shard: os.path.join(shard.ann_index_path, "CURRENT"))
+def get_ann_index(shard: Shard):
+    """Quantized vector index exported by ann_index.py (None if missing, built with another model or stale)."""
+    index = AnnIndex.open(shard.ann_index_path)
+    if index is not None and index.model_name != EMBEDDING_MODEL_NAME:
+        print(f"⚠️ {shard.ann_index_path} was built with '{index.model_name}'; using Chroma until it is re-exported.")
+        return None
+    if index is not None and index.fingerprint != fingerprint_collection(get_chroma_collection(shard.name)):
+        print(f"⚠️ {shard.ann_index_path} is older than the collection; using Chroma until it is re-exported "
+              f"with `python ann_index.py`.")
+        return None
+    return index
+
+@lazy
+def get_query_embedder():
+    return get_embedding_model()
+
+@lazy
+def get_router():
+    """Query router for the configured embedding model (trained on first use)."""
+    return QueryRouter.load_or_train(get_query_embedder(), EMBEDDING_MODEL_NAME, config.get("router_path", ROUTER_PATH))
+
+@per_shard(watch=lambda shard: shard.overview_path)
+def get_overview(shard: Shard):
+    """Overview precomputed by parser.py (None until it has been run)."""
+    return load_overview(shard.overview_path)
+
+# Token counter for prompt budgets (tiktoken / Hugging Face tokenizer, else an estimate)
+def count_tokens(text: str) -> int:
+    return get_token_counter(config.get("tokenizer"))(text)
+
+# Codebase overview that fits the configured token budget (split between selected shards)
+def codebase_overview(parsed_data: dict = None, shards: list = ()) -> str:
+    budget = config.get("overview_token_budget", 2000)
+    if shards:
+        return "\n\n".join(
+            f"## Repository: {shard}\n" + render_overview(get_overview(shard) or {"packages": []}, budget // len(shards), count_tokens)
+            for shard in shards
+        )
+    overview = get_overview()
+    if overview is None:
+        return generate_codebase_summary(parsed_data or get_parsed_data())
+    return render_overview(overview, budget, count_tokens)
+
+@per_shard(watch=lambda shard: shard.lexical_index_path)
+def get_lexical_index(shard: Shard):
+    """Lexical/symbol index built by chromaDB.py (None until it has been run)."""
+    return LexicalIndex.load(shard.lexical_index_path)
+
+@per_shard(watch=lambda shard: shard.call_graph_path)
+def get_call_graph(shard: Shard):
+    """Call graph written by parser.py (None until it has been run)."""
+    return CallGraph.load(shard.call_graph_path)
+
+def warm_up(shards: list = None):
+    """Load every resource up front (used by the server)."""
+    get_llm()
+    get_query_embedder()
+    if config.get("router", True):
+        get_router()
+    getters = [get_chroma_collection, get_overview, get_lexical_index, get_call_graph]
+    # Opening the ANN index fingerprints the whole collection, so only do it when it is queried
+    if config.get("vector_backend", "chroma") == "ann":
+        getters.append(get_ann_index)
+    for shard in shards or [None]:
+        for get in getters:
+            get(shard)
+
+# Record how long each stage of a turn took
+def record_stage_timings(timings: dict, mode: str):
+    for name, t in timings.items():
+        telemetry.observe("stage_seconds", t["seconds"], stage=name, status=t["status"])
+    telemetry.event("stages", mode=mode, timings=timings)
+
+# Embed a question for the vector search / semantic cache
+def embed_query(query: str) -> list:
+    with telemetry.span("embed", kind="query"):
+        return get_query_embedder().embed_query(query)
+
+# Pick how to answer a question; returns (route, query embedding)
+def route_query(query: str, query_embedding=None) -> tuple:
+    """
+    The router reuses the embedding that retrieval needs anyway, so it is
+    computed here and passed on. With `router: false` in model_config.json
+    the keyword classifier is used and nothing is embedded up front.
+    """
+    if not config.get("router", True):
+        return classify_query(query), query_embedding
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    with telemetry.span("route") as span:
+        route, confidence = get_router().route(query, query_embedding)
+        span.update(route=route, confidence=round(confidence, 3))
+    telemetry.inc("routes_total", route=route)
+    return route, query_embedding
+
+# Turn parallel id/metadata/document lists from Chroma into snippet dicts
+def to_snippets(ids: list, metadatas: list, documents: list, scores: dict = None, shard: str = None) -> list:
     results = []
-    for i in range(len(search_results["ids"][0])):
-        meta = search_results["metadatas"][0][i]
+    for doc_id, meta, document in zip(ids, metadatas, documents):
         results.append({
+            "id": doc_id,
+            "shard": shard,
+            "symbol": meta.get("symbol", ""),
+            "content_hash": meta.get("content_hash", ""),
             "name": meta.get("name", ""),
             "file": meta.get("file", ""),
-            "code": search_results["documents"][0][i][:2000],   # truncate long code
-            "preceding_comments": json.loads(meta.get("preceding_comments", "[]"))
+            "type": meta.get("type", ""),
+            "start_line": meta.get("start_line", 0),
+            "end_line": meta.get("end_line", 0),
+            "code": document,
+            "preceding_comments": json.loads(meta.get("preceding_comments", "[]")),
+            "part": meta.get("part", 1),
+            "parts": meta.get("parts", 1),
+            "score": (scores or {}).get(doc_id, 0.0)
         })
+    return results
+
+# Stored (ids, metadatas, documents) for `ids`, in their order; ids no longer stored are skipped
+def get_documents(ids: list, shard: str = None) -> tuple:
+    if not ids:
+        return [], [], []
+    stored = get_chroma_collection(shard).get(ids=ids, include=["metadatas", "documents"])
+    by_id = {doc_id: (meta, doc) for doc_id, meta, doc in zip(stored["ids"], stored["metadatas"], stored["documents"])}
+    present = [doc_id for doc_id in ids if doc_id in by_id]
+    return present, [by_id[doc_id][0] for doc_id in present], [by_id[doc_id][1] for doc_id in present]
+
+# Fetch stored snippets by id, keeping the order of `ids`
+def fetch_snippets(ids: list, scores: dict = None, shard: str = None) -> list:
+    return to_snippets(*get_documents(ids, shard), scores, shard)
+
+# Nearest chunks to a query vector: (ids, metadatas, documents), best first
+def vector_search(query_embedding, top_k: int = 5, shard: str = None) -> tuple:
+    """
+    With `"vector_backend": "ann"` and an exported index, the neighbours
+    come from the in-process quantized index and only their documents are
+    read from Chroma (by id); otherwise Chroma runs the vector query.
+    """
+    index = get_ann_index(shard) if config.get("vector_backend", "chroma") == "ann" else None
+    if index is None:
+        results = get_chroma_collection(shard).query(query_embeddings=[query_embedding], n_results=top_k,
+                                                     include=["metadatas", "documents"])
+        return results["ids"][0], results["metadatas"][0], results["documents"][0]
+
+    with telemetry.span("ann_search", shard=shard or "default"):
+        hits = index.search([query_embedding], top_k, config.get("ann_nprobe", DEFAULT_NPROBE))[0]
+    # Ids deleted from Chroma since the export are skipped
+    return get_documents([doc_id for doc_id, _ in hits], shard)
+
+# Search ChromaDB for code snippets
+def search_codebase(query: str, top_k: int = 5, query_embedding=None, shard: str = None):
+    """
+    Hybrid retrieval: vector hits fused with BM25 hits by reciprocal rank.
+
+    A query that is only about one unambiguous symbol (e.g. "what does
+    CodeParser.parse do?") is answered from the symbol table without
+    embedding or a vector query. Other symbols the query names are fused
+    in as a third ranking. Scores are reciprocal-rank scores, so hits from
+    different shards can be merged on them.
+    """
+    lexical_index = get_lexical_index(shard)
+    symbol_ids = []
+    if lexical_index is not None:
+        exact_ids = lexical_index.exact_symbol(query)
+        if exact_ids:
+            return fetch_snippets(exact_ids[:top_k], dict(reciprocal_rank_fusion([exact_ids])), shard)
+        symbol_ids = lexical_index.lookup_symbols(query)
+
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    vector_ids, vector_metadatas, vector_documents = vector_search(query_embedding, top_k, shard)
+
+    if lexical_index is None:
+        scores = dict(reciprocal_rank_fusion([vector_ids]))
+        return to_snippets(vector_ids, vector_metadatas, vector_documents, scores, shard)
+
+    lexical_ids = [doc_id for doc_id, _ in lexical_index.search(query, top_k=top_k)]
+    fused = reciprocal_rank_fusion([vector_ids, lexical_ids] + ([symbol_ids[:top_k]] if symbol_ids else []))[:top_k]
+    scores = dict(fused)
+
+    vector_hits = {
+        doc_id: (meta, doc)
+        for doc_id, meta, doc in zip(vector_ids, vector_metadatas, vector_documents)
+    }
+    missing = [doc_id for doc_id, _ in fused if doc_id not in vector_hits]
+    extra = {s["id"]: s for s in fetch_snippets(missing, scores, shard)}
 
+    results = []
+    for doc_id, _ in fused:
+        if doc_id in vector_hits:
+            meta, doc = vector_hits[doc_id]
+            results.extend(to_snippets([doc_id], [meta], [doc], scores, shard))
+        elif doc_id in extra:
+            results.append(extra[doc_id])
     return results
 
-# Handle user question
-def ask_codebuddy(query: str, parsed_data: dict, chat_history: list, cache: dict) -> str:
-    # 🔍 Check cache first
-    cached = get_cached_response(cache, query)
-    if cached:
-        return f"(cached)\n{cached}"
+# Add the callees (and/or callers) of retrieved snippets, nearest first, within a token budget
+def expand_with_call_graph(snippets: list, hops: int = 1, token_budget: int = 1500,
+                           direction: str = "callees", shard: str = None) -> list:
+    call_graph = get_call_graph(shard)
+    if call_graph is None or not snippets or hops <= 0:
+        return snippets
+
+    reached = call_graph.expand([s["symbol"] for s in snippets], hops, direction)
+    via = {symbol_id(key): (hop, source) for key, hop, source in reached}
+    source_scores = {s["symbol"]: s.get("score", 0.0) for s in snippets}
+    present = {s["id"] for s in snippets}
+    candidates = fetch_snippets([symbol_id(key) for key, _, _ in reached if symbol_id(key) not in present], shard=shard)
+
+    expanded = list(snippets)
+    used = 0
+    for snippet in candidates:
+        cost = count_tokens(snippet["code"])
+        if used + cost > token_budget:
+            continue
+        hop, source = via[snippet["id"]]
+        relation = {"callees": "called by", "callers": "calls"}.get(direction, "related to")
+        snippet["preceding_comments"] = [f"{relation} {source.split('::')[1]} ({hop} hop)"] + snippet["preceding_comments"]
+        # Neighbours rank below the hit that led to them
+        snippet["score"] = source_scores.get(source, 0.0) * 0.5 ** hop
+        expanded.append(snippet)
+        used += cost
+    return expanded
+
+# Retrieve snippets from one shard, then pull in their call-graph neighbours
+def retrieve_from_shard(query: str, query_embedding=None, shard: str = None) -> list:
+    snippets = search_codebase(query, top_k=config.get("top_k", 7), query_embedding=query_embedding, shard=shard)
+    return expand_with_call_graph(
+        snippets,
+        hops=config.get("graph_hops", 1),
+        token_budget=config.get("graph_token_budget", 1500),
+        direction=config.get("graph_direction", "callees"),
+        shard=shard
+    )
 
-    query_type = classify_query(query)
+_shard_pool = ThreadPoolExecutor(max_workers=config.get("shard_workers", 8), thread_name_prefix="shard")
+
+# Retrieve from the default index, or fan out over the selected shards and merge
+def retrieve_context(query: str, query_embedding=None, shards: list = ()) -> list:
+    """
+    With several shards, each one is searched in parallel with its own
+    top_k, and the shards' rankings are fused by reciprocal rank, so no
+    shard's raw scores (e.g. an exact symbol hit) crowd out the others. A
+    shard that has not
+    answered within `shard_timeout` seconds is left out of this answer, so
+    one large or cold shard does not hold up the others.
+    """
+    with telemetry.span("retrieve", shards=len(shards)) as span:
+        if len(shards) <= 1:
+            snippets = retrieve_from_shard(query, query_embedding, shards[0] if shards else None)
+        else:
+            # Embed once up front instead of once per shard
+            if query_embedding is None:
+                query_embedding = embed_query(query)
+            futures = {
+                shard: _shard_pool.submit(retrieve_from_shard, query, query_embedding, shard)
+                for shard in shards
+            }
+            done, _ = wait(futures.values(), timeout=config.get("shard_timeout", 10))
+            rankings = []
+            by_key = {}
+            for shard, future in futures.items():
+                if future not in done:
+                    telemetry.inc("shard_timeouts_total", shard=shard)
+                    print(f"⚠️ Shard '{shard}' did not answer in time; skipping it.")
+                elif future.exception() is not None:
+                    telemetry.inc("shard_errors_total", shard=shard)
+                    print(f"⚠️ Shard '{shard}' failed: {future.exception()}")
+                else:
+                    ranked = sorted(future.result(), key=lambda s: s.get("score", 0.0), reverse=True)
+                    rankings.append([chunk_key(s) for s in ranked])
+                    by_key.update((chunk_key(s), s) for s in ranked)
+            snippets = []
+            for key, score in reciprocal_rank_fusion(rankings)[:config.get("global_top_k", 12)]:
+                by_key[key]["score"] = score
+                snippets.append(by_key[key])
+        span["results"] = len(snippets)
+    return snippets
+
+# {shard: chunk ids} of the one symbol a question is purely about (see LexicalIndex.exact_symbol)
+def find_exact_symbol(query: str, shards: list = ()) -> dict:
+    found = {}
+    for shard in shards or [None]:
+        lexical_index = get_lexical_index(shard)
+        ids = lexical_index.exact_symbol(query) if lexical_index is not None else []
+        if ids:
+            found[shard] = ids
+    return found
+
+# Exact symbol lookup from the symbol table without a vector query; [] unless the question is about one unambiguous symbol
+def lookup_symbol_context(query: str, shards: list = ()) -> list:
+    with telemetry.span("lookup", shards=len(shards)) as span:
+        snippets = []
+        for shard, ids in find_exact_symbol(query, shards).items():
+            ids = ids[:config.get("top_k", 7)]
+            snippets.extend(expand_with_call_graph(
+                fetch_snippets(ids, dict(reciprocal_rank_fusion([ids])), shard),
+                hops=config.get("graph_hops", 1),
+                token_budget=config.get("graph_token_budget", 1500),
+                direction=config.get("graph_direction", "callees"),
+                shard=shard
+            ))
+        span["results"] = len(snippets)
+    return snippets
+
+# Cache key for a chunk; chunks from a shard are prefixed with its name
+def chunk_key(snippet: dict) -> str:
+    return f"{snippet['shard']}::{snippet['id']}" if snippet.get("shard") else snippet["id"]
+
+# Check that cached answers were built from chunks that are still current
+def chunks_unchanged(chunks: dict) -> bool:
+    by_shard = {}
+    for key, digest in chunks.items():
+        shard, _, doc_id = key.rpartition("::")
+        by_shard.setdefault(shard or None, {})[doc_id] = digest
+    for shard, expected in by_shard.items():
+        stored = get_chroma_collection(shard).get(ids=list(expected), include=["metadatas"])
+        current = {doc_id: meta.get("content_hash") for doc_id, meta in zip(stored["ids"], stored["metadatas"])}
+        if any(current.get(doc_id) != digest for doc_id, digest in expected.items()):
+            return False
+    return True
+
+# Build the LLM prompt for a question; returns (prompt, {chunk id: content_hash})
+def build_prompt(query: str, parsed_data: dict = None, chat_history: list = (), summarizer=None,
+                 query_embedding=None, shards: list = (), route: str = None) -> tuple:
+    """
+    Retrieval (or the overview) and the pending history-summary update run
+    as overlapping stages with per-stage timeouts. If the summary update is
+    slow, the last completed summary is used; if retrieval times out, the
+    question is answered without code context.
+
+    `route` skips the router (see query_classifier.py for the routes).
+    """
+    if route is None:
+        route, query_embedding = route_query(query, query_embedding)
+    query_type = route
+    chunks = {}
+
+    stages = {}
+    if query_type == "overview":
+        stages["overview"] = lambda: codebase_overview(parsed_data, shards)
+    elif query_type == "symbol":
+        # A name that is not in the symbol table falls back to hybrid retrieval
+        stages["retrieve"] = lambda: (lookup_symbol_context(query, shards)
+                                      or retrieve_context(query, query_embedding, shards))
+    elif query_type != "chat":
+        stages["retrieve"] = lambda: retrieve_context(query, query_embedding, shards)
+    timeouts = config.get("stage_timeouts", {"retrieve": 15, "overview": 15, "summary": 2})
+    if summarizer is not None:
+        # Wait at most the stage timeout, so a slow update never holds a pipeline worker
+        stages["summary"] = lambda: summarizer.wait(timeouts.get("summary")) and summarizer.summary
+
+    mode = config.get("pipeline", "parallel")
+    results, timings = run_stages(stages, timeouts=timeouts, parallel=mode == "parallel")
+    record_stage_timings(timings, mode)
+    history_summary = results.get("summary") or (summarizer.summary if summarizer else "")
 
     if query_type == "overview":
-        summary = generate_codebase_summary(parsed_data)
-        context = summary
+        context = results["overview"] or ""
+    elif query_type == "chat":
+        context = ""
     else:
-        code_snippets = search_codebase(query, top_k=7)
-        log_query(query, code_snippets)
-
-        context = "\n\n".join([
-            f"📌 {c['name']} ({c['file']})\n"
-            f"💬 Comments: {' | '.join(c['preceding_comments'])}\n"
-            f"```python\n{c['code']}\n```"
-            for c in code_snippets
-        ])
-
-    memory_summary = summarize_history(llm, chat_history)
-    recent_dialogue = format_recent_turns(chat_history)
+        # Parts of one split symbol are packed as a single snippet
+        code_snippets, packing = pack_context(
+            merge_siblings(results["retrieve"] or []), config.get("context_token_budget", 3000), count_tokens
+        )
+        telemetry.event("query", query=query, query_type=query_type, **packing)
+        chunks = {chunk_key(p): p["content_hash"] for c in code_snippets for p in c.get("merged", [c])}
+        context = "\n\n".join(format_snippet(c) for c in code_snippets)
+
+    memory_summary, recent_dialogue = build_memory_context(
+        history_summary, chat_history, config.get("history_token_budget", 1024), count_tokens=count_tokens
+    )
 
     system_prefix = {
         "overview": "You are a senior Python software engineer.",
         "suggestion": "You are an expert Python code reviewer.",
+        "symbol": "You are a Python code assistant.",
         "function": "You are a Python code assistant."
     }.get(query_type, "You are a helpful assistant.")
 
@@ -132,24 +587,245 @@ def ask_codebuddy(query: str, parsed_data: dict, chat_history: list, cache: dict
 User: {query}
 Assistant:"""
 
+    return prompt, chunks
+
+class ClientDisconnected(Exception):
+    """Raised by an on_token callback whose listener went away; stops the answer instead of counting as an LLM error."""
+
+# Run the LLM, streaming chunks to on_token when given
+def generate_response(prompt: str, on_token=None) -> tuple:
+    """
+    Return (response, metrics). metrics has time_to_first_token, total_latency,
+    tokens, tokens_per_sec and cancelled. Ctrl-C while streaming stops the
+    generation and keeps the partial answer.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    cancelled = False
+
+    with telemetry.span("generate", stream=on_token is not None) as span:
+        if on_token is None:
+            parts.append(get_llm().invoke(prompt))
+            first_token_at = time.perf_counter()
+        else:
+            stream = get_llm().stream(prompt)
+            try:
+                for chunk in stream:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(chunk)
+                    on_token(chunk)
+            except KeyboardInterrupt:
+                cancelled = True
+            finally:
+                stream.close()
+        span["cancelled"] = cancelled
+
+    total = time.perf_counter() - start
+    # Ollama streams roughly one token per chunk
+    tokens = len(parts) if on_token is not None else count_tokens(parts[0])
+    generating = total - ((first_token_at or start) - start)
+    metrics = {
+        "time_to_first_token": round((first_token_at or time.perf_counter()) - start, 3),
+        "total_latency": round(total, 3),
+        "tokens": tokens,
+        "tokens_per_sec": round(tokens / generating, 2) if generating > 0 else 0.0,
+        "cancelled": cancelled
+    }
+    telemetry.inc("tokens_in_total", count_tokens(prompt))
+    telemetry.inc("tokens_out_total", tokens)
+    return "".join(parts), metrics
+
+# Handle user question
+def ask_codebuddy(query: str, parsed_data: dict, chat_history: list, cache, summarizer=None,
+                  on_token=None, use_cache: bool = True, shards: list = ()) -> tuple:
+    """Return (response, metrics); with on_token the answer is streamed as it is generated."""
+    start = time.perf_counter()
+
+    # A question about one exact symbol is answered from the symbol table, so it is never embedded
+    query_embedding = None
+    if find_exact_symbol(query, shards):
+        route = "symbol"
+    else:
+        route, query_embedding = route_query(query)
+        # With the keyword classifier the embedding is only needed here, for the semantic cache tier
+        if use_cache and cache.semantic_threshold is not None and query_embedding is None:
+            query_embedding = embed_query(query)
+
+    # Chat answers depend on the conversation, so they are neither served from nor stored in the cache
+    use_cache = use_cache and route != "chat"
+
+    # 🔍 Check cache first
+    cached = use_cache and get_cached_response(cache, query, query_embedding, validate=chunks_unchanged)
+    if use_cache:
+        telemetry.inc("cache_hits_total" if cached else "cache_misses_total", cache="response")
+    if cached:
+        response = f"(cached)\n{cached}"
+        if on_token:
+            on_token(response)
+        latency = round(time.perf_counter() - start, 3)
+        telemetry.observe("request_seconds", latency, cached="true")
+        return response, {"time_to_first_token": latency, "total_latency": latency, "cached": True}
+
+    prompt, chunks = build_prompt(query, parsed_data, chat_history, summarizer, query_embedding, shards, route)
+    prompt_ready = time.perf_counter()
+
     try:
-        response = llm.invoke(prompt)
+        response, metrics = generate_response(prompt, on_token)
+    except ClientDisconnected:
+        raise
+    except LLMBusy as e:
+        return f"⏳ The model is busy with other requests ({e}). Please try again shortly.", {"error": str(e)}
     except Exception as e:
-        response = f"❌ Error invoking LLM: {e}\nYour model might be too large for your system. Try a smaller model like phi3:3b."
+        error = f"❌ Error invoking LLM: {e}\nYour model might be too large for your system. Try a smaller model like phi3:3b."
+        return error, {"error": str(e)}
+
+    # Latencies are reported from when the question was asked
+    retrieval = prompt_ready - start
+    metrics["time_to_first_token"] = round(metrics["time_to_first_token"] + retrieval, 3)
+    metrics["total_latency"] = round(metrics["total_latency"] + retrieval, 3)
+    telemetry.observe("time_to_first_token_seconds", metrics["time_to_first_token"])
+    telemetry.observe("request_seconds", metrics["total_latency"], cached="false")
+
+    if metrics["cancelled"]:
+        return response + "\n[cancelled]", metrics
 
     # 💾 Cache response
-    set_cached_response(cache, query, response)
+    if use_cache:
+        set_cached_response(cache, query, response, query_embedding, chunks)
+
+    return response, metrics
+
+# Answers depend on which shards were searched, so each selection gets its own response cache
+def open_cache(project_id: str, shards: list):
+    namespace = project_id
+    if shards:
+        namespace += "-" + hashlib.md5(",".join(sorted(shards)).encode()).hexdigest()[:8]
+    return load_cache(
+        namespace,
+        max_entries=config.get("cache_max_entries", 256),
+        ttl_seconds=config.get("cache_ttl_seconds", 7 * 24 * 3600),
+        semantic_threshold=config.get("semantic_cache_threshold", 0.92)
+    )
 
-    return response
+# Turns kept in memory per session (enough for the prompt's recent window and the summarizer)
+HISTORY_WINDOW = 20
+
+# Per-project chat state shared by the CLI and the server
+def open_session(project_id: str = None, shards=None) -> dict:
+    """`shards` selects the indexes to search (default: the "shards" config key, else the default index)."""
+    project_id = project_id or get_project_id()
+    history = HistoryStore(get_history_path(project_id), config.get("history_max_turns", DEFAULT_MAX_TURNS))
+    shards = resolve_shards(config.get("shards") if shards is None else shards)
+    return {
+        "project_id": project_id,
+        "history": history,
+        # Only the recent window is kept in memory; older turns stay in the store
+        "chat_history": history.recent(HISTORY_WINDOW),
+        # Summaries queue behind interactive answers
+        "summarizer": RollingSummarizer(lambda: at_priority(get_llm(), BACKGROUND), history),
+        "shards": shards,
+        "cache": open_cache(project_id, shards),
+        # Response caches of other shard selections asked for per turn (see run_turn)
+        "caches": {},
+        "lock": threading.Lock()
+    }
+
+# Change which shards a session searches; raises KeyError for an unknown shard
+def select_shards(session: dict, names) -> list:
+    shards = resolve_shards(names)
+    with session["lock"]:
+        if shards != session["shards"]:
+            session["cache"].close()
+            session["shards"] = shards
+            session["cache"] = open_cache(session["project_id"], shards)
+    return shards
+
+# Response cache for a shard selection; call with the session lock held
+def _cache_for(session: dict, shards: list):
+    if shards == session["shards"]:
+        return session["cache"]
+    key = tuple(shards)
+    if key not in session["caches"]:
+        session["caches"][key] = open_cache(session["project_id"], shards)
+    return session["caches"][key]
+
+# Answer one question and record it in the session history
+def run_turn(session: dict, query: str, on_token=None, use_cache: bool = True, record=lambda: True,
+             shards: list = None) -> tuple:
+    """
+    `record()` is checked after answering; returning False (e.g. the client
+    went away) skips the history write. `shards` (resolved names) searches
+    other shards for this turn only, without changing the session's selection.
+    """
+    with session["lock"]:
+        shards = session["shards"] if shards is None else shards
+        response, metrics = ask_codebuddy(
+            query, None, session["chat_history"], _cache_for(session, shards), session["summarizer"],
+            on_token=on_token, use_cache=use_cache, shards=shards
+        )
+        if not record():
+            return response, metrics
+        session["chat_history"].append(session["history"].append(query, response, metrics))
+        del session["chat_history"][:-HISTORY_WINDOW]
+        # Fold older turns into the summary while the user reads the answer
+        session["summarizer"].schedule(session["chat_history"])
+    return response, metrics
+
+def clear_session(session: dict) -> bool:
+    with session["lock"]:
+        session["chat_history"].clear()
+        session["summarizer"].reset()
+        return session["history"].clear()
+
+# Client side of codebuddy_server.py
+def server_available(server_url: str) -> bool:
+    try:
+        with urllib.request.urlopen(f"{server_url}/health", timeout=0.5) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+def post_to_server(server_url: str, path: str, payload: dict):
+    request = urllib.request.Request(
+        f"{server_url}{path}",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    return urllib.request.urlopen(request, timeout=config.get("server_timeout", 600))
+
+def ask_remote(server_url: str, project_id: str, query: str, on_token=None, use_cache: bool = True,
+               shards: list = None) -> tuple:
+    """Ask through a running server; the answer is streamed back as NDJSON lines."""
+    payload = {"project_id": project_id, "query": query, "use_cache": use_cache}
+    if shards is not None:
+        payload["shards"] = shards
+    with post_to_server(server_url, "/ask", payload) as resp:
+        for line in resp:
+            message = json.loads(line)
+            if "token" in message:
+                if on_token:
+                    on_token(message["token"])
+            elif message.get("done"):
+                return message["response"], message["metrics"]
+    raise ConnectionError("Server closed the connection before the answer was complete")
 
 # CLI chat loop
-def chat_with_codebase():
+def chat_with_codebase(server_url: str = None, shards=None):
+    """Chat locally, or through a running codebuddy_server.py when server_url is reachable."""
     project_id = get_project_id()
-    history_path = get_history_path(project_id)
-    chat_history = load_chat_history(history_path)
-    cache = load_cache(project_id)
+    remote = bool(server_url) and server_available(server_url)
+    if server_url and not remote:
+        print(f"⚠️ No CodeBuddy server at {server_url}; running locally.")
+    try:
+        selected = resolve_shards(config.get("shards") if shards is None else shards)
+    except KeyError as e:
+        sys.exit(f"❌ {e.args[0]}")
+    session = None if remote else open_session(project_id, selected)
+    chat_history = load_chat_history(get_history_path(project_id), 2) if remote else session["chat_history"]
 
-    print("\n💬 Welcome to CodeBuddy! (type 'exit' to quit)\n")
+    print(f"\n💬 Welcome to CodeBuddy!{' (server: ' + server_url + ')' if remote else ''} (type 'exit' to quit)\n")
 
     if chat_history:
         print("📜 Restored previous session:\n")
@@ -160,25 +836,68 @@ def chat_with_codebase():
     while True:
         query = input("📝 You: ")
         if query.strip().lower() == "exit":
+            if not remote:
+                session["summarizer"].wait(timeout=30)
             print("👋 Exiting CodeBuddy. Chat history saved.")
+            if get_query_embedder.loaded() and hasattr(get_query_embedder(), "stats"):
+                cache_stats = get_query_embedder().stats()
+                print(f"🗃️ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
             break
         if query.strip().lower() == "delete history":
             confirmed = input("⚠️ This will erase your current session. Type 'yes' to confirm: ")
             if confirmed.lower() == "yes":
-                chat_history.clear()
-                deleted = delete_chat_history(history_path)
-                msg = "🧹 History cleared from memory and disk." if deleted else "⚠️ Memory cleared, but file not found."
+                if remote:
+                    with post_to_server(server_url, "/delete_history", {"project_id": project_id}) as resp:
+                        deleted = json.load(resp)["deleted"]
+                else:
+                    deleted = clear_session(session)
+                msg = "🧹 History cleared from memory and disk." if deleted else "⚠️ Memory cleared; no stored history was found."
                 print(msg)
             else:
                 print("❌ Cancelled. History not deleted.")
             continue
+        if query.strip().lower().split(" ", 1)[0] == "shards":
+            # "shards" lists them; "shards a,b" / "shards all" / "shards default" changes the selection
+            names = query.strip()[len("shards"):].strip()
+            if names:
+                try:
+                    selected = resolve_shards([] if names == "default" else names)
+                    if not remote:
+                        select_shards(session, selected)
+                except KeyError as e:
+                    print(f"❌ {e.args[0]}")
+            print(f"📦 Searching: {', '.join(selected) or 'default index'} · "
+                  f"registered: {', '.join(ShardRegistry.load().names()) or '(none)'}")
+            continue
 
-        response = ask_codebuddy(query, parsed_data, chat_history, cache)
-        print("\n🤖 CodeBuddy:\n", response)
+        stream = config.get("stream", True)
+        on_token = (lambda token: print(token, end="", flush=True)) if stream else None
+        if stream:
+            print("\n🤖 CodeBuddy:\n", end=" ", flush=True)
+        try:
+            if remote:
+                response, metrics = ask_remote(server_url, project_id, query, on_token, shards=selected)
+            else:
+                response, metrics = run_turn(session, query, on_token)
+        except KeyboardInterrupt:
+            print("\n⏹️ Cancelled.")
+            continue
 
-        chat_history = append_message(chat_history, query, response)
-        save_chat_history(history_path, chat_history)
-        save_cache(project_id, cache)
+        if stream:
+            print()
+        else:
+            print("\n🤖 CodeBuddy:\n", response)
+        if "tokens_per_sec" in metrics:
+            print(f"⏱️ first token {metrics['time_to_first_token']:.2f}s · "
+                  f"{metrics['tokens_per_sec']:.1f} tok/s · {metrics['total_latency']:.2f}s total\n")
 
 if __name__ == "__main__":
-    chat_with_codebase()
+    server_url = config.get("server_url")
+    if "--server" in sys.argv[1:]:
+        i = sys.argv.index("--server")
+        server_url = sys.argv[i + 1] if i + 1 < len(sys.argv) else "http://127.0.0.1:8765"
+    shards = None
+    if "--shards" in sys.argv[1:]:
+        i = sys.argv.index("--shards")
+        shards = sys.argv[i + 1] if i + 1 < len(sys.argv) else "all"
+    chat_with_codebase(server_url, shards)
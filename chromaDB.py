@@ -1,90 +1,274 @@
+import os
+import sys
 import json
-import hashlib
+import time
+import argparse
+import datetime
 import chromadb
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+from concurrent.futures import ThreadPoolExecutor
+import telemetry
+from code_store import STORE_PATH, CodeStore
+from symbols import iter_symbols, symbol_id, content_hash
+from chunker import MAX_CHUNK_CHARS, chunk_symbol
+from lexical_index import LexicalIndex
+from ann_index import AnnIndex, export_collection
+from shards import Shard, ShardRegistry
+from embeddings import (
+    EMBEDDING_MODEL_NAME,
+    get_embedding_model,
+    embedding_dimension,
+    check_collection_model,
+    record_collection_model
+)
 
-# Load parsed data
-with open("parsed_code.json", "r", encoding="utf-8") as f:
-    parsed_data = json.load(f)
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "codebase"
+DIFF_PATH = "parse_diff.json"
+batch_size = 500
+embed_batch_size = 64
 
-# Init ChromaDB
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-chroma_collection = chroma_client.get_or_create_collection(name="codebase")
 
-# Embedding model
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def build_documents(files=None, store_path=STORE_PATH, max_chunk_chars=MAX_CHUNK_CHARS):
+    """
+    Yield one document per parsed symbol (plus the README).
 
-batch_size = 500
-documents = []
-ids = set()
-batch_counter = 0
-
-# Add README.md if present
-readme_content = parsed_data.get("README", "")
-if readme_content:
-    readme_metadata = {
-        "file": "README.md",
-        "name": "Project README",
-        "docstring": "README provides an overview of the project."
-    }
-    documents.append({
-        "id": "README",
-        "content": readme_content.strip(),
-        "metadata": readme_metadata
-    })
-    ids.add("README")
-
-# Iterate parsed code
-for file_path, details in parsed_data["parsed_code"].items():
-    for item in details["functions_classes"]:
-        item_type = item.get("type", "Unknown")
-
-        unique_id = hashlib.md5(f"{file_path}::{item.get('name')}::{item.get('start_line', 1)}".encode()).hexdigest()
-        if unique_id in ids:
-            continue
-        ids.add(unique_id)
-
-        metadata = {
-            "file": file_path,
-            "name": item.get("name"),
-            "type": item_type,
-            "start_line": item.get("start_line", 1),
-            "end_line": item.get("end_line", 1),
-            "docstring": item.get("docstring", "") or "",
-            "calls": json.dumps(item.get("calls", [])),
-            "inline_comments": json.dumps(item.get("inline_comments", [])),
-            "preceding_comments": json.dumps(item.get("preceding_comments", []))
+    Ids come from the stable symbol key, and the content hash goes into the
+    metadata so a later sync can tell whether the code actually changed.
+    Symbols longer than `max_chunk_chars` are split into several documents
+    (see chunker.py). If `files` is given, only symbols from those files
+    are produced. Symbols are read from the memory-mapped code store one
+    file at a time.
+    """
+    store = CodeStore.open(store_path)
+    if store is None:
+        raise FileNotFoundError(f"No code store at {store_path}. Run `python parser.py` first.")
+    readme_content = store.readme()
+    if readme_content and files is None:
+        content = readme_content.strip()
+        yield {
+            "id": "README",
+            "content": content,
+            "metadata": {
+                "file": "README.md",
+                "name": "Project README",
+                "symbol": "README",
+                "docstring": "README provides an overview of the project.",
+                "content_hash": content_hash(content)
+            }
         }
 
-        documents.append({
-            "id": unique_id,
-            "content": item.get("code", "").strip(),
-            "metadata": metadata
-        })
-
-        if len(documents) >= batch_size:
-            batch_counter += 1
-            print(f"\U0001F680 Storing Batch {batch_counter} ({len(documents)} docs)...")
-            chroma_collection.add(
-                ids=[doc["id"] for doc in documents],
-                documents=[doc["content"] for doc in documents],
-                metadatas=[doc["metadata"] for doc in documents]
+    for file_path, details in store.iter_files():
+        if files is not None and file_path not in files:
+            continue
+        for symbol_key, symbol in iter_symbols(file_path, details):
+            for key, item in chunk_symbol(symbol_key, symbol, max_chunk_chars):
+                content = item.get("code", "").strip()
+                metadata = {
+                    "file": file_path,
+                    "name": item.get("name"),
+                    "symbol": symbol_key,
+                    "type": item.get("type", "Unknown"),
+                    "start_line": item.get("start_line", 1),
+                    "end_line": item.get("end_line", 1),
+                    "docstring": item.get("docstring", "") or "",
+                    "calls": json.dumps(item.get("calls", [])),
+                    "inline_comments": json.dumps(item.get("inline_comments", [])),
+                    "preceding_comments": json.dumps(item.get("preceding_comments", [])),
+                    "content_hash": content_hash(content)
+                }
+                if "part" in item:
+                    metadata.update(part=item["part"], parts=item["parts"])
+                yield {"id": symbol_id(key), "content": content, "metadata": metadata}
+
+
+def get_existing(collection, files=None) -> dict:
+    """Return {id: metadata} for what is already stored (optionally only for `files`)."""
+    if files is not None and not files:
+        return {}
+    where = {"file": {"$in": sorted(files)}} if files else None
+    stored = collection.get(where=where, include=["metadatas"])
+    return dict(zip(stored["ids"], stored["metadatas"]))
+
+
+def sync_collection(collection, embedding_model, files=None, embed_batch_size=embed_batch_size,
+                    store_path=STORE_PATH, max_chunk_chars=MAX_CHUNK_CHARS) -> dict:
+    """
+    Bring the collection in line with the parse output.
+
+    New or changed chunks (by content hash) are upserted and re-embedded,
+    chunks whose code is unchanged but whose metadata moved (e.g. shifted
+    line numbers) only get a metadata update, and ids that no longer exist
+    are deleted. With `files`, only those files are compared.
+
+    Embeddings are computed here with `embed_documents`, one batch at a time,
+    while the previous batch is written to Chroma on a background thread.
+    """
+    existing = get_existing(collection, files)
+    stats = {"upserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "embed_seconds": 0.0}
+    seen = set()
+    upserts = []
+    updates = []
+    writer = ThreadPoolExecutor(max_workers=1)
+    pending_write = None
+
+    def write_batch(batch, vectors):
+        with telemetry.span("upsert", docs=len(batch)):
+            collection.upsert(
+                ids=[doc["id"] for doc in batch],
+                embeddings=vectors,
+                documents=[doc["content"] for doc in batch],
+                metadatas=[doc["metadata"] for doc in batch]
             )
-            documents.clear()
-
-# Final batch flush
-if documents:
-    batch_counter += 1
-    print(f"\U0001F680 Storing Final Batch {batch_counter} ({len(documents)} docs)...")
-    chroma_collection.add(
-        ids=[doc["id"] for doc in documents],
-        documents=[doc["content"] for doc in documents],
-        metadatas=[doc["metadata"] for doc in documents]
-    )
-
-print(f"✅ All {batch_counter} batches stored successfully in ChromaDB!")
-
-# Check count
-stored_count = chroma_collection.count()
-print(f"\U0001F50D ChromaDB Document Count: {stored_count}")
+
+    def flush_upserts():
+        nonlocal pending_write
+        if not upserts:
+            return
+        batch = list(upserts)
+        upserts.clear()
+
+        start = time.perf_counter()
+        with telemetry.span("embed", docs=len(batch)):
+            vectors = embedding_model.embed_documents([doc["content"] for doc in batch])
+        stats["embed_seconds"] += time.perf_counter() - start
+        telemetry.inc("docs_embedded_total", len(batch))
+
+        # Only one write in flight: wait for batch N before queuing N+1,
+        # so memory stays bounded while embedding and writing overlap.
+        if pending_write is not None:
+            pending_write.result()
+        pending_write = writer.submit(write_batch, batch, vectors)
+        stats["upserted"] += len(batch)
+        print(f"\U0001F680 Upserted {stats['upserted']} changed docs...", end="\r")
+
+    def flush_updates():
+        if updates:
+            collection.update(
+                ids=[doc["id"] for doc in updates],
+                metadatas=[doc["metadata"] for doc in updates]
+            )
+            stats["updated"] += len(updates)
+            updates.clear()
+
+    try:
+        for doc in build_documents(files, store_path, max_chunk_chars):
+            if doc["id"] in seen:
+                continue
+            seen.add(doc["id"])
+
+            stored = existing.get(doc["id"])
+            if stored is None or stored.get("content_hash") != doc["metadata"]["content_hash"]:
+                upserts.append(doc)
+            elif stored != doc["metadata"]:
+                updates.append(doc)
+            else:
+                stats["unchanged"] += 1
+
+            if len(upserts) >= embed_batch_size:
+                flush_upserts()
+            if len(updates) >= batch_size:
+                flush_updates()
+
+        flush_upserts()
+        flush_updates()
+        if pending_write is not None:
+            pending_write.result()
+    finally:
+        writer.shutdown(wait=True)
+
+    stale = [doc_id for doc_id in existing if doc_id not in seen]
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    stats["deleted"] = len(stale)
+    telemetry.inc("docs_deleted_total", len(stale))
+
+    return stats
+
+
+def load_changed_files(diff_path=DIFF_PATH):
+    """Files touched by the last parser run, from parse_diff.json."""
+    with open(diff_path, "r", encoding="utf-8") as f:
+        diff = json.load(f)
+    return set(diff["changed"]) | set(diff["removed"])
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Sync parsed code into ChromaDB")
+    arg_parser.add_argument("--rebuild", action="store_true", help="drop the collection and index everything again")
+    arg_parser.add_argument("--changed-only", action="store_true",
+                            help="only compare files listed in parse_diff.json by the last parser run")
+    arg_parser.add_argument("--embed-batch-size", type=int, default=embed_batch_size,
+                            help="documents per embed_documents call")
+    arg_parser.add_argument("--no-embedding-cache", action="store_true",
+                            help="always call the model instead of the on-disk embedding cache")
+    arg_parser.add_argument("--max-chunk-chars", type=int, default=MAX_CHUNK_CHARS,
+                            help="split symbols longer than this into several chunks")
+    arg_parser.add_argument("--ann", choices=("int8", "float16"),
+                            help="also export the vectors to the in-process ANN index (see ann_index.py); "
+                                 "an existing index is re-exported with its dtype anyway")
+    arg_parser.add_argument("--shard", help="index a shard registered with shards.py into its own collection")
+    args = arg_parser.parse_args()
+
+    registry = ShardRegistry.load()
+    try:
+        shard = registry.get(args.shard) if args.shard else Shard()
+    except KeyError as e:
+        sys.exit(f"❌ {e.args[0]}")
+
+    # Embedding model
+    embedding_model = get_embedding_model(use_cache=not args.no_embedding_cache)
+    embedding_dim = embedding_dimension(embedding_model)
+
+    # Init ChromaDB
+    chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    if args.rebuild:
+        try:
+            chroma_client.delete_collection(shard.collection_name)
+        except Exception:
+            pass  # nothing to drop on a fresh ./chroma_db
+    chroma_collection = chroma_client.get_or_create_collection(name=shard.collection_name)
+
+    if chroma_collection.count() == 0:
+        record_collection_model(chroma_collection, EMBEDDING_MODEL_NAME, embedding_dim)
+    try:
+        check_collection_model(chroma_collection, EMBEDDING_MODEL_NAME, embedding_dim)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+
+    files = None
+    if args.changed_only and not args.rebuild and os.path.exists(shard.diff_path):
+        files = load_changed_files(shard.diff_path)
+
+    start = time.perf_counter()
+    stats = sync_collection(chroma_collection, embedding_model, files, args.embed_batch_size, shard.store_path,
+                            args.max_chunk_chars)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n✅ Sync complete: {stats['upserted']} upserted, {stats['updated']} metadata updates, "
+          f"{stats['deleted']} deleted, {stats['unchanged']} unchanged.")
+    if stats["upserted"]:
+        print(f"⏱️ Embedding: {stats['upserted'] / max(stats['embed_seconds'], 1e-9):.1f} docs/sec "
+              f"(batch size {args.embed_batch_size}); end to end: {stats['upserted'] / elapsed:.1f} docs/sec")
+    if hasattr(embedding_model, "stats"):
+        cache_stats = embedding_model.stats()
+        print(f"🗃️ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['entries']}/{cache_stats['max_entries']} entries")
+
+    # The lexical index is cheap to rebuild (no embeddings), so it always covers every file
+    lexical_index = LexicalIndex.build(build_documents(store_path=shard.store_path, max_chunk_chars=args.max_chunk_chars))
+    lexical_index.save(shard.lexical_index_path)
+    print(f"🔤 Lexical index: {len(lexical_index.ids)} docs, {len(lexical_index.postings)} terms, "
+          f"{len(lexical_index.symbols)} symbol names")
+
+    # Check count
+    stored_count = chroma_collection.count()
+    print(f"\U0001F50D ChromaDB Document Count: {stored_count}")
+    # An index that was exported before is refreshed, so it never serves vectors of edited code
+    existing_index = AnnIndex.open(shard.ann_index_path)
+    ann_dtype = args.ann or (existing_index.info["dtype"] if existing_index is not None else None)
+    if ann_dtype and stored_count:
+        info = export_collection(chroma_collection, shard.ann_index_path, ann_dtype)
+        print(f"🧭 ANN index: {info['count']} vectors ({info['dtype']}, {info['lists']} lists) in {shard.ann_index_path}")
+    if args.shard:
+        registry.update(args.shard, docs=stored_count, indexed_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        registry.save()
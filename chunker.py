@@ -0,0 +1,216 @@
+# chunker.py
+#
+# Splits oversized symbols into smaller chunks before they are embedded.
+#
+# A symbol whose code fits in `max_chars` stays one chunk with its usual id,
+# so most of the index is unaffected. A longer one (a big function, a class,
+# or a whole script with no defs) is cut at statement boundaries: first
+# between its top-level statements, then inside any statement that is still
+# too large, and only between plain lines when a single statement cannot be
+# split further. Consecutive chunks share `overlap_lines` lines. Part 1
+# keeps the symbol's id (so call-graph lookups still land on its head), and
+# every part records its parent symbol and position, so retrieved siblings
+# can be merged back with merge_siblings().
+
+import ast
+import textwrap
+
+MAX_CHUNK_CHARS = 1500
+OVERLAP_LINES = 2
+
+
+def _parse(code: str):
+    """Parse a symbol's code; methods and nested functions are indented, so dedent first (line numbers stay the same)."""
+    try:
+        return ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return None
+
+
+def _children(node):
+    for field in ("body", "orelse", "finalbody", "handlers", "cases"):
+        for child in getattr(node, field, None) or ():
+            if isinstance(child, ast.AST):
+                yield child
+
+
+def _line_range(node) -> tuple:
+    """0-based (first, end) lines of a statement, including its decorators."""
+    first = getattr(node, "lineno", None) or node.pattern.lineno  # match_case has no position of its own
+    first = min([first] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    end = getattr(node, "end_lineno", None) or node.body[-1].end_lineno
+    return first - 1, end
+
+
+def split_code(code: str, max_chars: int = MAX_CHUNK_CHARS, overlap_lines: int = OVERLAP_LINES) -> list:
+    """Line ranges [(start, end)) covering `code`, each at most `max_chars` long where possible."""
+    lines = code.split("\n")
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    def size(start, end):
+        return offsets[end] - offsets[start]
+
+    starts = set()
+
+    def visit(node):
+        for child in _children(node):
+            first, end = _line_range(child)
+            starts.add(first)
+            if size(first, end) > max_chars:
+                visit(child)
+
+    tree = _parse(code)
+    if tree is not None:
+        visit(tree)
+    # Comment lines directly above a statement belong with it
+    boundaries = set()
+    for start in starts:
+        while start > 0 and start - 1 not in starts and lines[start - 1].lstrip().startswith("#"):
+            start -= 1
+        boundaries.add(start)
+    boundaries = sorted(b for b in boundaries if 0 < b < len(lines)) + [len(lines)]
+
+    def end_from(start):
+        end = max((b for b in boundaries if b > start and size(start, b) <= max_chars), default=None)
+        if end is None:
+            # A statement larger than the limit with nothing inside to split at: cut between lines
+            end = start + 1
+            while end < len(lines) and size(start, end + 1) <= max_chars:
+                end += 1
+        return end
+
+    ranges = []
+    start = 0
+    end = end_from(start)
+    while True:
+        ranges.append((start, end))
+        if end >= len(lines):
+            break
+        # Step back by the overlap only if the next chunk then still reaches past this one
+        start = end - overlap_lines if end - overlap_lines > start else end
+        next_end = end_from(start)
+        if next_end <= end:
+            start = end
+            next_end = end_from(start)
+        end = next_end
+    return ranges
+
+
+def chunk_symbol(key: str, item: dict, max_chars: int = MAX_CHUNK_CHARS,
+                 overlap_lines: int = OVERLAP_LINES) -> list:
+    """
+    [(chunk key, record)] for one parsed symbol. Small symbols come back
+    unchanged; parts of a split one get `parent`, `part` and `parts`, their
+    own line range, and keys `key` (part 1), `key@2`, `key@3`, ...
+    Docstring, calls and comments stay on part 1 only.
+    """
+    code = item.get("code", "")
+    if len(code) <= max_chars:
+        return [(key, item)]
+    ranges = split_code(code, max_chars, overlap_lines)
+    if len(ranges) == 1:
+        return [(key, item)]
+
+    lines = code.split("\n")
+    # start_line is the def/class line, but the code starts at the first decorator
+    first_line = item.get("end_line", 1) - code.count("\n")
+    chunks = []
+    for n, (start, end) in enumerate(ranges, 1):
+        part = dict(
+            item,
+            code="\n".join(lines[start:end]),
+            start_line=first_line + start,
+            end_line=first_line + end - 1,
+            parent=key,
+            part=n,
+            parts=len(ranges)
+        )
+        if n > 1:
+            part.update(docstring="", calls=[], inline_comments=[], preceding_comments=[])
+        chunks.append((key if n == 1 else f"{key}@{n}", part))
+    return chunks
+
+
+def _join_parts(parts: list) -> dict:
+    parts = sorted({p["id"]: p for p in parts}.values(), key=lambda p: p["start_line"])
+    lines = {}
+    for part in parts:
+        for i, text in enumerate(part["code"].split("\n")):
+            lines.setdefault(part["start_line"] + i, text)
+
+    code = []
+    previous = None
+    for number in sorted(lines):
+        if previous is not None and number > previous + 1:
+            indent = lines[number][:len(lines[number]) - len(lines[number].lstrip())]
+            code.append(f"{indent}# ... (lines {previous + 1}-{number - 1} not retrieved)")
+        code.append(lines[number])
+        previous = number
+
+    head = parts[0]
+    return dict(
+        head,
+        code="\n".join(code),
+        end_line=max(p["end_line"] for p in parts),
+        score=max(p.get("score", 0.0) for p in parts),
+        preceding_comments=head["preceding_comments"] if head.get("part", 1) == 1 else [],
+        merged=parts
+    )
+
+
+def merge_siblings(snippets: list) -> list:
+    """
+    Join retrieved parts of the same symbol into one snippet, placed where
+    its best-ranked part was. Overlapping lines appear once, and gaps
+    between non-adjacent parts are marked. The merged snippet lists its
+    parts under "merged".
+    """
+    groups = {}
+    for snippet in snippets:
+        if snippet.get("parts", 1) > 1:
+            groups.setdefault((snippet.get("shard"), snippet["symbol"]), []).append(snippet)
+
+    merged = []
+    emitted = set()
+    for snippet in snippets:
+        group_key = (snippet.get("shard"), snippet.get("symbol"))
+        if snippet.get("parts", 1) <= 1 or len(groups[group_key]) == 1:
+            merged.append(snippet)
+        elif group_key not in emitted:
+            emitted.add(group_key)
+            merged.append(_join_parts(groups[group_key]))
+    return merged
+
+
+def _check(name: str, ok: bool, detail: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    return ok
+
+
+if __name__ == "__main__":
+    # Self-check: python chunker.py (exit 1 if any check fails)
+    import sys
+
+    # A large method, indented as the parser slices it out of its class
+    method = ["    def handle(self, request):"]
+    for k in range(30):
+        method += [f"        if request.kind == {k}:"]
+        method += [f"            value_{j} = self.compute({j}, 'argument text for kind {k}')" for j in range(6)]
+    code = "\n".join(method)
+    statement_starts = {1 + 7 * k for k in range(30)} | {len(method)}
+    ranges = split_code(code, 800)
+    ok = _check("indented method", len(ranges) > 1 and all(end in statement_starts for _, end in ranges),
+                f"{len(method)} lines split into {len(ranges)} chunks, all ending at statement boundaries")
+    ok &= _check("size", all(len("\n".join(method[a:b])) <= 800 for a, b in ranges), "every chunk within 800 chars")
+
+    # Decorated symbol: part line ranges must follow the code, which starts at the decorators
+    decorated = "\n".join(["    @first", "    @second"] + method[:60])
+    item = {"code": decorated, "start_line": 12, "end_line": 10 + decorated.count("\n")}
+    parts = [part for _, part in chunk_symbol("f.py::handle::Function", item, 800)]
+    source = {10 + i: line for i, line in enumerate(decorated.split("\n"))}
+    ok &= _check("decorated lines", all(
+        part["code"].split("\n") == [source[n] for n in range(part["start_line"], part["end_line"] + 1)] for part in parts
+    ), f"{len(parts)} parts, line ranges match the source (last ends at {parts[-1]['end_line']} of {item['end_line']})")
+    sys.exit(0 if ok else 1)
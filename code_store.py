@@ -0,0 +1,319 @@
+# code_store.py
+
+import os
+import mmap
+import json
+import hashlib
+import numpy as np
+
+PARSED_PATH = "parsed_code.ndjson"
+# Every file record starts with its JSON-encoded path, so readers can find
+# the path without decoding the (large) rest of the line
+FILE_RECORD_PREFIX = '{"file": '
+
+
+class NDJSONWriter:
+    """
+    Streams parse results to disk one line per file.
+
+    Writes go to a temporary file that replaces the target on close, so a
+    reader (or the incremental parser reading the previous output) never
+    sees a half-written file.
+    """
+
+    def __init__(self, path: str = PARSED_PATH):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.count = 0
+        self._f = open(self.tmp_path, "w", encoding="utf-8")
+
+    def write_readme(self, content: str):
+        self._write({"kind": "readme", "content": content})
+
+    def write_file(self, file_path: str, data: dict, error: str = None):
+        record = {"kind": "file", "data": data}
+        if error:
+            record["error"] = error
+        # The path is written first by hand (see FILE_RECORD_PREFIX), not left to dict order
+        self._f.write(FILE_RECORD_PREFIX + json.dumps(file_path, ensure_ascii=False) + ", ")
+        self._f.write(json.dumps(record, ensure_ascii=False)[1:])
+        self._f.write("\n")
+        self.count += 1
+
+    def write_raw(self, line: str):
+        """Copy an already-serialized record through unchanged."""
+        self._f.write(line if line.endswith("\n") else line + "\n")
+        self.count += 1
+
+    def _write(self, record: dict):
+        self._f.write(json.dumps(record, ensure_ascii=False))
+        self._f.write("\n")
+
+    def close(self):
+        self._f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            os.remove(self.tmp_path)
+
+
+def iter_raw_records(path: str = PARSED_PATH):
+    """Yield (file_path, raw_line) for every file record, without decoding the payload."""
+    if not os.path.exists(path):
+        return
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith(FILE_RECORD_PREFIX):
+                yield decoder.raw_decode(line, len(FILE_RECORD_PREFIX))[0], line
+                continue
+            # Any other layout (e.g. output from an older version) is decoded in full
+            record = json.loads(line)
+            if record.get("kind") == "file":
+                yield record["file"], line
+
+
+def iter_parsed_files(path: str = PARSED_PATH):
+    """Yield (file_path, details) for every parsed file, one at a time."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["kind"] == "file":
+                yield record["file"], record["data"]
+
+
+def load_readme(path: str = PARSED_PATH) -> str:
+    """Return the README content stored on the first line of the output."""
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        record = json.loads(f.readline() or "{}")
+    return record.get("content", "") if record.get("kind") == "readme" else ""
+
+
+def load_parsed_code(path: str = PARSED_PATH) -> dict:
+    """Load the whole parse output in the {"README", "parsed_code"} shape."""
+    return {
+        "README": load_readme(path),
+        "parsed_code": dict(iter_parsed_files(path))
+    }
+
+
+STORE_PATH = "code_store"
+
+SYMBOL_DTYPE = np.dtype([
+    ("file", "<i4"),
+    ("name", "<i4"),
+    ("qualname", "<i4"),
+    ("type", "<i4"),
+    ("start_line", "<i4"),
+    ("end_line", "<i4"),
+    ("code_offset", "<i8"),
+    ("code_length", "<i4"),
+    ("meta_offset", "<i8"),
+    ("meta_length", "<i4"),
+])
+
+META_FIELDS = ("docstring", "calls", "inline_comments", "preceding_comments", "methods")
+
+
+class BlobWriter:
+    """Append-only blob file that stores identical byte strings once."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "wb")
+        self.offset = 0
+        self._seen = {}
+
+    def add(self, data: bytes) -> tuple:
+        key = hashlib.sha1(data).digest()
+        if key not in self._seen:
+            self._f.write(data)
+            self._seen[key] = (self.offset, len(data))
+            self.offset += len(data)
+        return self._seen[key]
+
+    def close(self):
+        self._f.close()
+
+
+class CodeStore:
+    """
+    Compact, memory-mapped store of parsed symbols.
+
+    - symbols.npy: one fixed-width row per symbol (SYMBOL_DTYPE) with file,
+      name and type interned into strings.json
+    - blobs.bin: deduplicated UTF-8 blobs for code and per-symbol metadata.
+      A method's code is stored as a byte range inside its class's blob,
+      so class and method source is kept once.
+
+    Both files are memory-mapped, so opening the store costs almost nothing
+    and code is only read for the symbols that are actually used.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, "store.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        with open(os.path.join(path, "strings.json"), "r", encoding="utf-8") as f:
+            self.strings = json.load(f)
+        self._readme = info["readme"]
+        self.symbols = np.load(os.path.join(path, "symbols.npy"), mmap_mode="r")
+        blob_path = os.path.join(path, "blobs.bin")
+        self._blob_file = open(blob_path, "rb")
+        self.blobs = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(blob_path) else b""
+        self._by_qualname = None
+
+    @classmethod
+    def open(cls, path: str = STORE_PATH):
+        """Open the store, or return None if the parser has not written one."""
+        if not os.path.exists(os.path.join(path, "store.json")):
+            return None
+        return cls(path)
+
+    def close(self):
+        """Release the memory-mapped blobs and symbols."""
+        if isinstance(self.blobs, mmap.mmap):
+            self.blobs.close()
+        self.blobs = b""
+        self._blob_file.close()
+        self.symbols = np.zeros(0, dtype=SYMBOL_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def build(parsed_files, readme: str = "", path: str = STORE_PATH):
+        """Write a store from (file_path, details) pairs, one file at a time."""
+        os.makedirs(path, exist_ok=True)
+        strings, string_ids = [], {}
+
+        def intern(value: str) -> int:
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        blobs = BlobWriter(os.path.join(path, "blobs.bin.tmp"))
+        rows = []
+        readme_ref = blobs.add((readme or "").encode("utf-8"))
+
+        for file_path, details in parsed_files:
+            items = details.get("functions_classes", [])
+            # Largest first, so a class blob exists before its methods look for themselves in it
+            order = sorted(range(len(items)), key=lambda i: len(items[i].get("code", "")), reverse=True)
+            file_blobs = []  # (blob offset, first line, last line, byte offset of each line, code)
+            code_refs = {}
+            for i in order:
+                item = items[i]
+                code = item.get("code", "").encode("utf-8")
+                # Code is a run of whole source lines ending at end_line, so a nested
+                # symbol's position inside its enclosing blob follows from its line numbers
+                last = item.get("end_line", 1)
+                first = last - code.count(b"\n")
+                for blob_offset, blob_first, blob_last, line_offsets, blob in file_blobs:
+                    if code and blob_first <= first and last <= blob_last:
+                        pos = line_offsets[first - blob_first]
+                        if blob[pos:pos + len(code)] == code:
+                            code_refs[i] = (blob_offset + pos, len(code))
+                            break
+                else:
+                    code_refs[i] = blobs.add(code)
+                    line_offsets = [0]
+                    for line in code.split(b"\n")[:-1]:
+                        line_offsets.append(line_offsets[-1] + len(line) + 1)
+                    file_blobs.append((code_refs[i][0], first, last, line_offsets, code))
+
+            for i, item in enumerate(items):
+                meta = {k: item[k] for k in META_FIELDS if item.get(k) not in (None, [])}
+                meta_ref = blobs.add(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+                rows.append((
+                    intern(file_path),
+                    intern(item.get("name", "")),
+                    intern(item.get("qualname") or item.get("name", "").split("::")[-1]),
+                    intern(item.get("type", "Unknown")),
+                    item.get("start_line", 1),
+                    item.get("end_line", 1),
+                    code_refs[i][0], code_refs[i][1],
+                    meta_ref[0], meta_ref[1],
+                ))
+        blobs.close()
+
+        np.save(os.path.join(path, "symbols.tmp.npy"), np.array(rows, dtype=SYMBOL_DTYPE))
+        with open(os.path.join(path, "strings.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(strings, f, ensure_ascii=False)
+        with open(os.path.join(path, "store.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"readme": list(readme_ref), "symbols": len(rows)}, f)
+
+        os.replace(os.path.join(path, "blobs.bin.tmp"), os.path.join(path, "blobs.bin"))
+        os.replace(os.path.join(path, "symbols.tmp.npy"), os.path.join(path, "symbols.npy"))
+        os.replace(os.path.join(path, "strings.json.tmp"), os.path.join(path, "strings.json"))
+        os.replace(os.path.join(path, "store.json.tmp"), os.path.join(path, "store.json"))
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _blob(self, offset: int, length: int) -> str:
+        return bytes(self.blobs[offset:offset + length]).decode("utf-8")
+
+    def readme(self) -> str:
+        return self._blob(*self._readme)
+
+    def code(self, symbol: int) -> str:
+        row = self.symbols[symbol]
+        return self._blob(int(row["code_offset"]), int(row["code_length"]))
+
+    def record(self, symbol: int, with_code: bool = True) -> dict:
+        """Rebuild the parser's record for one symbol."""
+        row = self.symbols[symbol]
+        record = {
+            "type": self.strings[row["type"]],
+            "name": self.strings[row["name"]],
+            "qualname": self.strings[row["qualname"]],
+            "start_line": int(row["start_line"]),
+            "end_line": int(row["end_line"]),
+        }
+        meta = json.loads(self._blob(int(row["meta_offset"]), int(row["meta_length"])))
+        record.update({k: meta.get(k, None if k == "docstring" else []) for k in META_FIELDS})
+        if with_code:
+            record["code"] = self.code(symbol)
+        return record
+
+    def file_of(self, symbol: int) -> str:
+        return self.strings[self.symbols[symbol]["file"]]
+
+    def iter_files(self, with_code: bool = True):
+        """Yield (file_path, {"functions_classes": [...]}) in stored order, one file at a time."""
+        files = self.symbols["file"]
+        start = 0
+        for end in range(1, len(files) + 1):
+            if end == len(files) or files[end] != files[start]:
+                yield self.strings[files[start]], {
+                    "functions_classes": [self.record(i, with_code) for i in range(start, end)]
+                }
+                start = end
+
+    def find(self, qualname: str) -> list:
+        """Symbol indices whose qualname (or its last part) equals `qualname`."""
+        if self._by_qualname is None:
+            index = {}
+            for i, string_id in enumerate(self.symbols["qualname"]):
+                name = self.strings[string_id]
+                index.setdefault(name, []).append(i)
+                short = name.rsplit(".", 1)[-1]
+                if short != name:
+                    index.setdefault(short, []).append(i)
+            self._by_qualname = index
+        return self._by_qualname.get(qualname, [])
@@ -0,0 +1,154 @@
+# codebuddy_server.py
+#
+# Long-lived CodeBuddy process: keeps the LLM client, Chroma collection,
+# embedding model and caches warm so CLI sessions and editor integrations
+# share them instead of paying the start-up cost each time. Indexes that
+# parser.py, chromaDB.py or ann_index.py rewrite while it runs are reloaded
+# on the next question (see per_shard in chatbot_langchain.py).
+#
+#     python codebuddy_server.py [--port 8765]
+#     python chatbot_langchain.py --server http://127.0.0.1:8765
+#
+# Endpoints (localhost only):
+#     GET  /health                                  -> {"status": "ok", "model": ...}
+#     GET  /metrics                                 -> Prometheus text (unless "metrics_endpoint" is false)
+#     POST /ask {"project_id", "query", "use_cache", "shards"} -> NDJSON: {"token": ...}* then {"done": true, "response", "metrics"}
+#     POST /delete_history {"project_id"}            -> {"deleted": bool}
+
+import json
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import telemetry
+import chatbot_langchain as bot
+
+DEFAULT_PORT = 8765
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def get_session(project_id: str) -> dict:
+    with sessions_lock:
+        if project_id not in sessions:
+            sessions[project_id] = bot.open_session(project_id)
+        return sessions[project_id]
+
+
+class CodeBuddyHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0: the streamed /ask body ends when the connection closes
+    protocol_version = "HTTP/1.0"
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "ok", "model": bot.config["model_name"]})
+        elif self.path == "/metrics" and bot.config.get("metrics_endpoint", True):
+            body = telemetry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+
+        if self.path == "/ask":
+            self._ask(payload)
+        elif self.path == "/delete_history":
+            deleted = bot.clear_session(get_session(payload.get("project_id") or bot.get_project_id()))
+            self._send_json({"deleted": deleted})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _ask(self, payload: dict):
+        query = payload.get("query", "").strip()
+        if not query:
+            self._send_json({"error": "missing query"}, 400)
+            return
+        session = get_session(payload.get("project_id") or bot.get_project_id())
+        # The shards apply to this request only; concurrent requests of a project share its session
+        shards = None
+        if "shards" in payload:
+            try:
+                shards = bot.resolve_shards(payload["shards"])
+            except KeyError as e:
+                self._send_json({"error": e.args[0]}, 400)
+                return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        connected = [True]
+
+        def send_line(message: dict):
+            try:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            except OSError as e:
+                # Client hung up (e.g. Ctrl-C): stop generating, keep the history clean
+                connected[0] = False
+                raise bot.ClientDisconnected() from e
+
+        try:
+            response, metrics = bot.run_turn(
+                session, query,
+                on_token=lambda token: send_line({"token": token}),
+                use_cache=payload.get("use_cache", True),
+                record=lambda: connected[0],
+                shards=shards
+            )
+        except bot.ClientDisconnected:
+            return
+        if connected[0]:
+            try:
+                send_line({"done": True, "response": response, "metrics": metrics})
+            except bot.ClientDisconnected:
+                pass
+
+    def log_message(self, format, *args):
+        pass  # keep the console for the start-up banner
+
+
+def serve(port: int = DEFAULT_PORT):
+    print("⏳ Warming up (LLM client, Chroma, embedding model, indexes)...")
+    bot.warm_up(bot.resolve_shards(bot.config.get("shards")))
+    server = ThreadingHTTPServer(("127.0.0.1", port), CodeBuddyHandler)
+    server.daemon_threads = True
+    print(f"✅ CodeBuddy server listening on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Shutting down.")
+    finally:
+        for session in sessions.values():
+            session["summarizer"].wait(timeout=30)
+        telemetry.flush()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run CodeBuddy as a shared local server")
+    arg_parser.add_argument("--port", type=int, default=bot.config.get("server_port", DEFAULT_PORT))
+    args = arg_parser.parse_args()
+    serve(args.port)
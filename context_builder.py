@@ -1,33 +1,139 @@
 # context_builder.py
 
-def summarize_history(llm, chat_history: list) -> str:
-    """Summarize earlier messages using the LLM."""
-    if len(chat_history) <= 2:
-        return ""
+import threading
+import telemetry
 
-    older_turns = chat_history[:-2]
-    summary_input = "\n".join([
+RECENT_TURNS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def format_turns(turns: list) -> str:
+    return "\n\n".join([
         f"User: {h['user']}\nAssistant: {h['assistant']}"
-        for h in older_turns
+        for h in turns
     ])
 
+
+def update_rolling_summary(llm, state: dict, new_turns: list) -> dict:
+    """
+    Fold the turns that just left the recent window into the running summary.
+
+    Only the turns after state["covered"] (a turn id) are sent to the LLM,
+    so the cost per turn stays constant instead of growing with the session.
+    """
+    if not new_turns:
+        return state
+
     prompt = f"""
-Summarize the following conversation between a user and an assistant.
-Only include key topics or decisions.
+Update the summary of a conversation between a user and an assistant with the new turns below.
+Only include key topics or decisions. Reply with the updated summary only.
+
+# Current summary:
+{state["summary"] or "(empty)"}
 
-{summary_input}
+# New turns:
+{format_turns(new_turns)}
 """
     try:
-        summary = llm.invoke(prompt)
-        return summary.strip()
+        with telemetry.span("summarize", turns=len(new_turns)):
+            summary = llm.invoke(prompt)
     except Exception as e:
-        return f"(⚠️ Could not summarize: {e})"
+        print(f"⚠️ Could not update conversation summary: {e}")
+        return state
+    return {"summary": summary.strip(), "covered": new_turns[-1]["id"]}
+
+
+class RollingSummarizer:
+    """
+    Keeps the rolling summary in the history store and updates it on a
+    background thread.
+
+    `llm_factory` returns the LLM and is only called when an update runs,
+    so creating a summarizer does not start the LLM client.
+    """
+
+    def __init__(self, llm_factory, store, limit: int = RECENT_TURNS):
+        self.llm_factory = llm_factory
+        self.store = store
+        self.limit = limit
+        self.state = store.load_summary()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def summary(self) -> str:
+        return self.state["summary"]
 
+    def schedule(self, chat_history: list):
+        """
+        Start an update for the turns that fell out of the recent window, if any.
 
-def format_recent_turns(chat_history: list, limit: int = 3) -> str:
+        `chat_history` only needs to hold the recent window; older turns that
+        are not summarized yet are read from the store.
+        """
+        if len(chat_history) <= self.limit:
+            return
+        window_start = chat_history[-self.limit]["id"]
+        if window_start - 1 <= self.state["covered"]:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return  # the next schedule() call picks up what this one missed
+
+        self._thread = threading.Thread(target=self._update, args=(window_start,), daemon=True)
+        self._thread.start()
+
+    def _update(self, window_start: int):
+        with self._lock:
+            new_turns = self.store.turns_between(self.state["covered"], window_start)
+            state = update_rolling_summary(self.llm_factory(), self.state, new_turns)
+            if state is not self.state:
+                self.state = state
+                self.store.save_summary(state)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for a pending update; returns False if it is still running."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def reset(self):
+        """Forget the summary (the store's clear() removes it from disk)."""
+        self.wait()
+        self.state = {"summary": "", "covered": 0}
+
+
+def build_memory_context(summary: str, chat_history: list, token_budget: int,
+                         limit: int = RECENT_TURNS, count_tokens=estimate_tokens) -> tuple:
+    """
+    Return (summary, recent_dialogue) that together fit in `token_budget`.
+
+    The newest turns are kept first; the summary gets what is left, and is
+    cut down from the end if even that does not fit.
+    """
+    recent = []
+    used = 0
+    for turn in reversed(chat_history[-limit:]):
+        text = format_turns([turn])
+        cost = count_tokens(text)
+        if used + cost > token_budget:
+            break
+        recent.insert(0, turn)
+        used += cost
+
+    remaining = token_budget - used
+    summary_tokens = count_tokens(summary) if summary else 0
+    if summary_tokens > remaining:
+        keep = int(len(summary) * max(remaining, 0) / summary_tokens)
+        summary = summary[:keep].rsplit(" ", 1)[0] if keep else ""
+
+    return summary, format_turns(recent)
+
+
+def format_recent_turns(chat_history: list, limit: int = RECENT_TURNS) -> str:
     """Format recent chat history turns for inclusion in prompt."""
-    recent_turns = chat_history[-limit:]
-    return "\n\n".join([
-        f"User: {h['user']}\nAssistant: {h['assistant']}"
-        for h in recent_turns
-    ])
+    return format_turns(chat_history[-limit:])
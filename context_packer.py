@@ -0,0 +1,120 @@
+# context_packer.py
+
+import functools
+from context_builder import estimate_tokens
+
+DEFAULT_ENCODING = "cl100k_base"
+# A chunk whose lines are at least this much inside an already packed chunk adds nothing new
+OVERLAP_RATIO = 0.5
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(name: str = None):
+    """
+    Return a `count(text) -> int` function.
+
+    `name` is tried as a tiktoken encoding (default cl100k_base), then as a
+    Hugging Face tokenizer; if neither is available the ~4 characters per
+    token estimate is used.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(name or DEFAULT_ENCODING)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        pass  # not installed, unknown encoding, or the encoding file cannot be downloaded
+    if name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception:
+            pass
+    return estimate_tokens
+
+
+def format_snippet(snippet: dict) -> str:
+    """How a code snippet appears in the prompt."""
+    return (
+        f"📌 {snippet['name']} ({snippet['file']})\n"
+        f"💬 Comments: {' | '.join(snippet['preceding_comments'])}\n"
+        f"```python\n{snippet['code']}\n```"
+    )
+
+
+def line_overlap(a: dict, b: dict) -> int:
+    """Number of source lines two snippets share (0 for different files/shards or no line info)."""
+    same_file = (a.get("shard"), a.get("file")) == (b.get("shard"), b.get("file"))
+    if not same_file or not a.get("start_line") or not b.get("start_line"):
+        return 0
+    return max(0, min(a["end_line"], b["end_line"]) - max(a["start_line"], b["start_line"]) + 1)
+
+
+def line_count(snippet: dict) -> int:
+    return max(1, snippet.get("end_line", 0) - snippet.get("start_line", 0) + 1)
+
+
+def truncate_to_budget(snippet: dict, token_budget: int, count_tokens) -> dict:
+    """Cut a snippet's code at a line boundary so its formatted text fits in `token_budget`."""
+    lines = snippet["code"].split("\n")
+    low, high = 0, len(lines)
+    while low < high:
+        mid = (low + high + 1) // 2
+        candidate = dict(snippet, code="\n".join(lines[:mid]) + "\n# ...")
+        if count_tokens(format_snippet(candidate)) <= token_budget:
+            low = mid
+        else:
+            high = mid - 1
+    if low == 0:
+        return None
+    return dict(snippet, code="\n".join(lines[:low]) + "\n# ...", end_line=snippet.get("start_line", 1) + low - 1)
+
+
+def pack_context(snippets: list, token_budget: int, count_tokens=estimate_tokens) -> tuple:
+    """
+    Choose which retrieved snippets go into the prompt.
+
+    Snippets are taken in order of relevance per token. One that mostly
+    overlaps (by file and line range) a snippet already taken, e.g. a method
+    next to its class, or a class next to the method that was taken first,
+    is dropped as redundant. The rest are added while they fit in
+    `token_budget`. If not even the best snippet fits, it is cut down to the
+    budget instead of leaving the context empty.
+
+    Returns (packed snippets in their original rank order, stats).
+    """
+    # Snippets without a score (e.g. plain vector hits) fall back to their rank
+    scored = any(s.get("score") for s in snippets)
+    candidates = []
+    for rank, snippet in enumerate(snippets):
+        relevance = snippet.get("score", 0.0) if scored else 1.0 / (rank + 1)
+        cost = count_tokens(format_snippet(snippet))
+        candidates.append((relevance / max(cost, 1), rank, snippet, cost))
+    candidates.sort(key=lambda c: (-c[0], c[1]))
+
+    packed = []
+    used = 0
+    stats = {"candidates": len(snippets), "redundant": 0, "over_budget": 0, "truncated": 0}
+    for _, rank, snippet, cost in candidates:
+        if any(
+            line_overlap(snippet, other) >= OVERLAP_RATIO * min(line_count(snippet), line_count(other))
+            for _, other in packed
+        ):
+            stats["redundant"] += 1
+            continue
+        if used + cost > token_budget:
+            if packed:
+                stats["over_budget"] += 1
+                continue
+            snippet = truncate_to_budget(snippet, token_budget, count_tokens)
+            if snippet is None:
+                stats["over_budget"] += 1
+                continue
+            cost = count_tokens(format_snippet(snippet))
+            stats["truncated"] += 1
+        packed.append((rank, snippet))
+        used += cost
+
+    stats["packed"] = len(packed)
+    stats["tokens"] = used
+    return [snippet for _, snippet in sorted(packed, key=lambda p: p[0])], stats
@@ -0,0 +1,197 @@
+# embedding_cache.py
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+import telemetry
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".codebuddy_cache", "embeddings")
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a chunk so whitespace-only edits hit the same cache entry."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(model_name: str, text: str, kind: str = "doc") -> str:
+    """Key for (model name, normalized text hash); queries and documents are kept apart."""
+    digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{kind}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache: float32 vectors in a memory-mapped array and a
+    SQLite index mapping key -> row.
+
+    The array has a fixed number of rows. When it is full, the least
+    recently used tenth of the entries is evicted in one go and their rows
+    are reused. Several processes (indexer, chat sessions) can share one
+    cache: lookups and row allocation both run inside a write transaction,
+    so a row cannot be evicted and reused while it is being read. Threads
+    share the connection under a lock.
+    """
+
+    def __init__(self, model_name: str, dim: int, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = os.path.join(cache_dir, slug)
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self.db.commit()
+
+        meta = dict(self.db.execute("SELECT name, value FROM meta"))
+        if meta:
+            if int(meta["dim"]) != dim:
+                raise ValueError(f"Embedding cache in {self.dir} holds {meta['dim']}-d vectors, got {dim}-d")
+            self.max_entries = int(meta["max_entries"])
+        else:
+            self.max_entries = max_entries
+            self.db.executemany("INSERT OR IGNORE INTO meta VALUES (?, ?)", [
+                ("dim", str(dim)), ("max_entries", str(max_entries)), ("next_row", "0")
+            ])
+            self.db.commit()
+
+        vectors_path = os.path.join(self.dir, "vectors.f32")
+        mode = "r+" if os.path.exists(vectors_path) else "w+"
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(self.max_entries, dim))
+
+    def get_many(self, keys: list) -> list:
+        """Return a vector (list of floats) or None for every key."""
+        found = {}
+        with self.lock, self.db:
+            # Hold the write lock while reading rows, so no other process can evict and reuse them meanwhile
+            self.db.execute("BEGIN IMMEDIATE")
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self.db.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk
+                ))
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                    [(now, key) for key in found])
+            rows = {key: self.vectors[row].tolist() for key, row in found.items()}
+
+        results = []
+        for key in keys:
+            vector = rows.get(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            results.append(vector)
+        return results
+
+    def put_many(self, keys: list, vectors: list):
+        """Store vectors, evicting least recently used entries when full."""
+        pairs = dict(zip(keys, vectors))
+        now = time.time()
+        with self.lock:
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                already = {k for k, in self.db.execute(
+                    f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(pairs))})", list(pairs)
+                )} if pairs else set()
+                new_keys = [k for k in pairs if k not in already]
+                rows = self._allocate_rows(len(new_keys))
+                for key, row in zip(new_keys, rows):
+                    self.vectors[row] = np.asarray(pairs[key], dtype=np.float32)
+                self.db.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                                    [(key, row, now) for key, row in zip(new_keys, rows)])
+            self.vectors.flush()
+
+    def _allocate_rows(self, count: int) -> list:
+        """Hand out `count` rows from the free list, then fresh rows, evicting if needed."""
+        count = min(count, self.max_entries)
+        rows = [r for r, in self.db.execute("SELECT row FROM free_rows LIMIT ?", (count,))]
+        if rows:
+            self.db.executemany("DELETE FROM free_rows WHERE row = ?", [(r,) for r in rows])
+
+        next_row = int(self.db.execute("SELECT value FROM meta WHERE name = 'next_row'").fetchone()[0])
+        fresh = min(count - len(rows), self.max_entries - next_row)
+        rows.extend(range(next_row, next_row + fresh))
+        self.db.execute("UPDATE meta SET value = ? WHERE name = 'next_row'", (str(next_row + fresh),))
+
+        if len(rows) < count:
+            evict = max(count - len(rows), self.max_entries // 10)
+            victims = list(self.db.execute(
+                "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (evict,)
+            ))
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+            freed = [r for _, r in victims]
+            take = count - len(rows)
+            rows.extend(freed[:take])
+            self.db.executemany("INSERT INTO free_rows VALUES (?)", [(r,) for r in freed[take:]])
+        return rows
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self.lock:
+            size = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries
+        }
+
+
+class CachedEmbeddings:
+    """
+    Drop-in wrapper for a LangChain embeddings object (embed_documents /
+    embed_query) that only calls the model for texts missing from the cache.
+    """
+
+    def __init__(self, model, model_name: str, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model = model
+        self.model_name = model_name
+        dim = len(model.embed_query("dimension probe"))
+        self.cache = EmbeddingCache(model_name, dim, cache_dir, max_entries)
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [cache_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        telemetry.inc("cache_hits_total", len(texts) - len(missing), cache="embedding")
+        telemetry.inc("cache_misses_total", len(missing), cache="embedding")
+        if missing:
+            computed = self.model.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+            self.cache.put_many([keys[i] for i in missing], computed)
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        key = cache_key(self.model_name, text, kind="query")
+        vector = self.cache.get_many([key])[0]
+        telemetry.inc("cache_misses_total" if vector is None else "cache_hits_total", cache="embedding")
+        if vector is None:
+            vector = self.model.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return vector
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,66 @@
+# embeddings.py
+
+from embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, use_cache: bool = True):
+    """
+    Embedding model shared by the indexer and the chatbot.
+
+    With use_cache, vectors are looked up in (and added to) the on-disk
+    embedding cache before the model is called.
+    """
+    # Imported here: langchain/torch take seconds to import and most callers
+    # only need the model on first use.
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name=model_name)
+    if use_cache:
+        return CachedEmbeddings(model, model_name)
+    return model
+
+
+def embedding_dimension(embedding_model) -> int:
+    return len(embedding_model.embed_query("dimension probe"))
+
+
+def embedding_metadata(model_name: str, dim: int) -> dict:
+    """Collection metadata recording how the stored vectors were produced."""
+    return {"embedding_model": model_name, "embedding_dim": dim}
+
+
+def check_collection_model(collection, model_name: str, dim: int = None):
+    """
+    Raise ValueError unless the collection was indexed with `model_name`.
+
+    Collections written before the model was recorded (vectors produced by
+    Chroma's own default embedding function) are rejected as well.
+    """
+    metadata = collection.metadata or {}
+    stored_model = metadata.get("embedding_model")
+    if stored_model is None:
+        raise ValueError(
+            f"Collection '{collection.name}' has no recorded embedding model. "
+            f"Re-index it with `python chromaDB.py --rebuild`."
+        )
+    if stored_model != model_name:
+        raise ValueError(
+            f"Collection '{collection.name}' was indexed with '{stored_model}', "
+            f"but '{model_name}' is configured. Re-index it or switch models."
+        )
+    if dim is not None and metadata.get("embedding_dim") != dim:
+        raise ValueError(
+            f"Collection '{collection.name}' stores {metadata.get('embedding_dim')}-d vectors, "
+            f"but '{model_name}' produces {dim}-d vectors."
+        )
+
+
+def record_collection_model(collection, model_name: str, dim: int):
+    """Store the embedding model in the collection metadata."""
+    metadata = {
+        k: v for k, v in (collection.metadata or {}).items()
+        if not k.startswith("hnsw:")  # distance settings cannot be modified
+    }
+    metadata.update(embedding_metadata(model_name, dim))
+    collection.modify(metadata=metadata)
@@ -2,10 +2,16 @@
 
 import os
 import json
+import sqlite3
 import hashlib
+import threading
 from datetime import datetime
 from subprocess import check_output
 
+DEFAULT_MAX_TURNS = 1000
+# Trim only once the cap is exceeded by this fraction, so deletes are batched
+COMPACT_SLACK = 0.1
+
 def get_project_id() -> str:
     """Get a unique hash for the current project based on Git root or cwd."""
     try:
@@ -15,37 +21,155 @@ def get_project_id() -> str:
     return hashlib.md5(repo_root.encode()).hexdigest()
 
 def get_history_path(project_id: str) -> str:
-    """Return path to the history file for a given project."""
+    """Return path to the history database for a given project."""
     history_dir = os.path.join(os.getcwd(), ".codebuddy_history")
     os.makedirs(history_dir, exist_ok=True)
-    return os.path.join(history_dir, f"chat_{project_id}.json")
-
-def load_chat_history(history_path: str) -> list:
-    if os.path.exists(history_path):
-        with open(history_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
-def save_chat_history(history_path: str, history: list):
-    with open(history_path, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2)
-
-def append_message(history: list, user_msg: str, assistant_msg: str) -> list:
-    history.append({
-        "timestamp": datetime.utcnow().isoformat(),
-        "user": user_msg,
-        "assistant": assistant_msg
-    })
-    return history
-
-def delete_chat_history(history_path: str) -> bool:
-    """Delete the chat history file from disk if it exists."""
-    try:
-        if os.path.exists(history_path):
-            os.remove(history_path)
-            return True
-        return False
-    except Exception as e:
-        print(f"⚠️ Failed to delete history: {e}")
-        return False
+    return os.path.join(history_dir, f"chat_{project_id}.sqlite")
+
+
+class HistoryStore:
+    """
+    Append-only chat history for one project in SQLite (WAL mode).
+
+    Each turn is a single INSERT, so writes cost the same however long the
+    session is, and several sessions on the same project can append at once.
+    Only the most recent turns are ever read back (by primary key). Once the
+    table grows past `max_turns` by COMPACT_SLACK, the oldest turns are
+    deleted in one batch. The rolling summary of older turns lives in the
+    same database.
+    """
+
+    def __init__(self, path: str, max_turns: int = DEFAULT_MAX_TURNS):
+        self.path = path
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._since_compact = 0
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            user TEXT,
+            assistant TEXT,
+            metrics TEXT
+        )""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            summary TEXT,
+            covered INTEGER
+        )""")
+        self.db.commit()
+        self._import_legacy_json()
+
+    def _import_legacy_json(self):
+        """One-time import of the chat_<project>.json / summary_<project>.json files used before."""
+        legacy_path = self.path[:-len(".sqlite")] + ".json"
+        if not os.path.exists(legacy_path) or self.count():
+            return
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            turns = json.load(f)
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT INTO turns (timestamp, user, assistant, metrics) VALUES (?, ?, ?, ?)",
+                [(t.get("timestamp"), t["user"], t["assistant"], json.dumps(t["metrics"]) if t.get("metrics") else None)
+                 for t in turns]
+            )
+        # The old summary counted covered turns; imported ids start at 1, so the count is the last covered id
+        directory, name = os.path.split(legacy_path)
+        summary_path = os.path.join(directory, name.replace("chat_", "summary_", 1))
+        if os.path.exists(summary_path):
+            with open(summary_path, "r", encoding="utf-8") as f:
+                self.save_summary(json.load(f))
+            os.replace(summary_path, summary_path + ".migrated")
+        os.replace(legacy_path, legacy_path + ".migrated")
+        self.compact()
+
+    @staticmethod
+    def _turn(row) -> dict:
+        turn = {"id": row[0], "timestamp": row[1], "user": row[2], "assistant": row[3]}
+        if row[4]:
+            turn["metrics"] = json.loads(row[4])
+        return turn
+
+    def append(self, user_msg: str, assistant_msg: str, metrics: dict = None) -> dict:
+        """Store one turn atomically and return it (with its id)."""
+        timestamp = datetime.utcnow().isoformat()
+        with self._lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO turns (timestamp, user, assistant, metrics) VALUES (?, ?, ?, ?)",
+                (timestamp, user_msg, assistant_msg, json.dumps(metrics) if metrics else None)
+            )
+        turn = {"id": cursor.lastrowid, "timestamp": timestamp, "user": user_msg, "assistant": assistant_msg}
+        if metrics:
+            turn["metrics"] = metrics
+        # Checking the cap every `slack` appends keeps the table within max_turns * (1 + 2 * COMPACT_SLACK)
+        self._since_compact += 1
+        if self._since_compact >= max(1, int(self.max_turns * COMPACT_SLACK)):
+            self.compact()
+        return turn
+
+    def recent(self, n: int) -> list:
+        """The last `n` turns, oldest first."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT id, timestamp, user, assistant, metrics FROM turns ORDER BY id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [self._turn(row) for row in reversed(rows)]
 
+    def turns_between(self, after_id: int, before_id: int) -> list:
+        """Turns with after_id < id < before_id, oldest first."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT id, timestamp, user, assistant, metrics FROM turns WHERE id > ? AND id < ? ORDER BY id",
+                (after_id, before_id)
+            ).fetchall()
+        return [self._turn(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    def compact(self):
+        """Drop turns beyond the retention cap and fold the WAL back into the database."""
+        self._since_compact = 0
+        if self.count() <= self.max_turns * (1 + COMPACT_SLACK):
+            return
+        with self._lock:
+            with self.db:
+                self.db.execute(
+                    "DELETE FROM turns WHERE id <= (SELECT id FROM turns ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (self.max_turns,)
+                )
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def load_summary(self) -> dict:
+        """The rolling summary and the id of the last turn it covers."""
+        with self._lock:
+            row = self.db.execute("SELECT summary, covered FROM summary WHERE id = 1").fetchone()
+        return {"summary": row[0], "covered": row[1]} if row else {"summary": "", "covered": 0}
+
+    def save_summary(self, state: dict):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO summary (id, summary, covered) VALUES (1, ?, ?)",
+                (state["summary"], state["covered"])
+            )
+
+    def clear(self) -> bool:
+        """Delete all turns and the summary; returns False if there was nothing to delete."""
+        with self._lock, self.db:
+            deleted = self.db.execute("DELETE FROM turns").rowcount
+            deleted += self.db.execute("DELETE FROM summary").rowcount
+        return deleted > 0
+
+    def close(self):
+        self.db.close()
+
+
+def load_chat_history(history_path: str, limit: int = 20) -> list:
+    """The last `limit` turns of a project's history."""
+    store = HistoryStore(history_path)
+    try:
+        return store.recent(limit)
+    finally:
+        store.close()
@@ -0,0 +1,178 @@
+# lexical_index.py
+
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+
+LEXICAL_INDEX_PATH = "./chroma_db/lexical_index.json"
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+CAMEL_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+# Query words that look like code: snake_case, camelCase, dotted names, `quoted` or call syntax
+CODE_LIKE = re.compile(r"`([^`]+)`|([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)+)|"
+                       r"\b([A-Za-z_][A-Za-z0-9_]*)\(\)|\b([A-Za-z]*_[A-Za-z0-9_]*|[A-Za-z][a-z0-9]+[A-Z][A-Za-z0-9]*)\b")
+
+NAME_BOOST = 3
+# Words that do not change which symbol a question is about ("what does X do?")
+QUESTION_WORDS = {
+    "a", "an", "the", "what", "whats", "does", "do", "did", "is", "are", "was", "how", "where", "which",
+    "show", "me", "explain", "describe", "tell", "about", "please", "can", "you", "find", "see", "look",
+    "up", "at", "give", "print", "display", "of", "for", "in", "this", "that", "it", "its", "s", "to",
+    "function", "method", "class", "code", "source", "body", "definition", "defined", "define",
+    "implementation", "implemented", "work", "works", "doing", "used", "mean", "means"
+}
+
+
+def tokenize(text: str) -> list:
+    """Lowercased identifiers plus their snake_case / camelCase parts."""
+    tokens = []
+    for word in IDENTIFIER.findall(text or ""):
+        lower = word.lower()
+        tokens.append(lower)
+        parts = [p.lower() for piece in word.split("_") for p in CAMEL_PART.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def code_terms(query: str) -> list:
+    """Identifier-looking words of a query, e.g. visit_ClassDef, CodeParser.parse, `run`."""
+    terms = []
+    for match in CODE_LIKE.finditer(query):
+        term = next(group for group in match.groups() if group)
+        terms.append(term.strip().rstrip("()"))
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 index over symbol names, docstrings, comments, calls and code
+    identifiers, plus an exact symbol-name table. Built next to the Chroma
+    collection by chromaDB.py and stored as one JSON file.
+    """
+
+    def __init__(self, ids=None, doc_lengths=None, postings=None, symbols=None):
+        self.ids = ids or []
+        self.doc_lengths = doc_lengths or []
+        self.postings = postings or {}
+        # {name: [[chunk ids of one symbol], ...]}; indexes saved before chunking hold plain ids
+        self.symbols = {
+            name: [[g] if isinstance(g, str) else g for g in groups] for name, groups in (symbols or {}).items()
+        }
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, documents) -> "LexicalIndex":
+        """Build from chromaDB.build_documents() output."""
+        ids, doc_lengths = [], []
+        postings = defaultdict(list)
+        symbols = defaultdict(dict)
+
+        for doc in documents:
+            meta = doc["metadata"]
+            symbol = meta.get("symbol", "")
+            qualname = symbol.split("::")[1] if symbol.count("::") >= 2 else meta.get("name", "")
+
+            tokens = tokenize(qualname) * NAME_BOOST
+            tokens += tokenize(meta.get("docstring", ""))
+            for field in ("preceding_comments", "inline_comments", "calls"):
+                tokens += tokenize(" ".join(json.loads(meta.get(field, "[]"))))
+            tokens += tokenize(doc["content"])
+
+            doc_index = len(ids)
+            ids.append(doc["id"])
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append([doc_index, tf])
+
+            if qualname:
+                # Chunks of one split symbol are grouped, so a name can be checked for being unambiguous
+                for name in {qualname, qualname.rsplit(".", 1)[-1]}:
+                    symbols[name].setdefault(symbol, []).append(doc["id"])
+
+        symbols = {name: list(groups.values()) for name, groups in symbols.items()}
+        return cls(ids, doc_lengths, dict(postings), symbols)
+
+    def search(self, query: str, top_k: int = 10, k1: float = 1.2, b: float = 0.75) -> list:
+        """Return [(id, score)] ranked by BM25."""
+        n = len(self.ids)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_index, tf in posting:
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_index] / self.avg_length)
+                scores[doc_index] += idf * tf * (k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.ids[doc_index], score) for doc_index, score in ranked]
+
+    def resolve(self, term: str) -> list:
+        """
+        Symbols named `term` (case-sensitive) as [[chunk ids]]. A dotted name
+        that is not in the table falls back to its last part, which may match
+        several symbols.
+        """
+        for candidate in (term, term.rsplit(".", 1)[-1]):
+            if candidate in self.symbols:
+                return self.symbols[candidate]
+        return []
+
+    def lookup_symbols(self, query: str) -> list:
+        """Ids of symbols named by code-like words in the query."""
+        found = []
+        for term in code_terms(query):
+            for group in self.resolve(term):
+                for doc_id in group:
+                    if doc_id not in found:
+                        found.append(doc_id)
+        return found
+
+    def exact_symbol(self, query: str) -> list:
+        """
+        Chunk ids of the one symbol a query is purely about, e.g. "What does
+        CodeParser.parse do?", or [] if the query names no symbol, several
+        symbols or an ambiguous name (e.g. __init__), or asks about more
+        than the symbol itself.
+        """
+        terms = code_terms(query)
+        if len(terms) != 1 or len(self.symbols.get(terms[0], [])) != 1:
+            return []
+        rest = [w.lower() for w in IDENTIFIER.findall(CODE_LIKE.sub(" ", query))]
+        if any(w not in QUESTION_WORDS for w in rest):
+            return []
+        return self.symbols[terms[0]][0]
+
+    def save(self, path: str = LEXICAL_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self.ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+                "symbols": self.symbols
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH):
+        """Load the index, or return None if it has not been built yet."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["doc_lengths"], data["postings"], data["symbols"])
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Fuse several ranked id lists into [(id, score)], best first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,267 @@
+# llm_client.py
+#
+# Client for Ollama's /api/generate shared by every session in the process:
+#
+#     llm = OllamaClient("http://localhost:11434", "phi3:3b", max_concurrent=2)
+#     for chunk in llm.stream(prompt): ...              # interactive answer
+#     at_priority(llm, BACKGROUND).invoke(prompt)       # history summary
+#
+# - keep-alive HTTP connections from a pooled requests.Session
+# - at most `max_concurrent` requests run at once. The rest wait in a
+#   priority queue (interactive answers before background summaries), which
+#   holds at most `max_queue` requests; past that, or after waiting
+#   `queue_timeout` seconds, LLMBusy is raised instead of piling up more work
+# - an overall `timeout` per request, with connection errors, timeouts and
+#   429/5xx answers retried with jittered exponential backoff as long as
+#   nothing has been streamed yet
+# - identical prompts that are in flight at the same time share one request;
+#   every caller receives the full stream
+
+import copy
+import json
+import time
+import heapq
+import random
+import hashlib
+import itertools
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import telemetry
+
+INTERACTIVE = 0
+BACKGROUND = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMBusy(LLMError):
+    """Too many requests are already waiting for the model."""
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class _RetryableStatus(LLMError):
+    pass
+
+
+class PriorityGate:
+    """Counting semaphore that admits the lowest priority value first (FIFO within a priority)."""
+
+    def __init__(self, slots: int, max_waiting: int = None):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiting = []  # heap of (priority, seq, Event)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: float = None):
+        with self._lock:
+            if self.active < self.slots and not self._waiting:
+                self.active += 1
+                return
+            if self.max_waiting is not None and len(self._waiting) >= self.max_waiting:
+                raise LLMBusy(f"{len(self._waiting)} requests are already waiting for the model")
+            entry = (priority, next(self._seq), threading.Event())
+            heapq.heappush(self._waiting, entry)
+        if entry[2].wait(timeout):
+            return
+        with self._lock:
+            if entry[2].is_set():
+                return  # a slot was handed over just as the wait timed out
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+        raise LLMBusy(f"No model slot became free within {timeout}s")
+
+    def release(self):
+        with self._lock:
+            if self._waiting:
+                # The slot passes straight to the next waiter
+                heapq.heappop(self._waiting)[2].set()
+            else:
+                self.active -= 1
+
+    def waiting(self) -> int:
+        with self._lock:
+            return len(self._waiting)
+
+
+class _Flight:
+    """One request to the model and the chunks streamed so far, shared by every caller that asked for it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.consumers = 0
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+
+class OllamaClient:
+    """
+    Drop-in for the LangChain Ollama LLM (`invoke` / `stream`), safe to
+    share between threads. Copies made by `with_priority` share the
+    connection pool, the queue and the in-flight requests.
+    """
+
+    def __init__(self, host: str, model: str, temperature: float = None, max_tokens: int = None,
+                 max_concurrent: int = 2, max_queue: int = 32, queue_timeout: float = 120,
+                 timeout: float = 300, connect_timeout: float = 5, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, pool_size: int = 8):
+        self.url = host.rstrip("/") + "/api/generate"
+        self.model = model
+        self.options = {}
+        if temperature is not None:
+            self.options["temperature"] = temperature
+        if max_tokens is not None:
+            self.options["num_predict"] = max_tokens
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.priority = INTERACTIVE
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, max_concurrent))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.gate = PriorityGate(max_concurrent, max_queue)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def with_priority(self, priority: int) -> "OllamaClient":
+        view = copy.copy(self)
+        view.priority = priority
+        return view
+
+    def invoke(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt: str):
+        """Yield the answer as it is generated; closing the generator early cancels the request if nobody else is waiting on it."""
+        key = hashlib.sha1(json.dumps([self.model, self.options, prompt]).encode("utf-8")).hexdigest()
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                threading.Thread(
+                    target=self._run, args=(key, flight, prompt, self.priority), name="llm-request", daemon=True
+                ).start()
+            else:
+                telemetry.inc("llm_coalesced_total")
+            with flight.cond:
+                flight.consumers += 1
+
+        seen = 0
+        try:
+            while True:
+                with flight.cond:
+                    while seen == len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    new_chunks = flight.chunks[seen:]
+                    finished = flight.done
+                seen += len(new_chunks)
+                yield from new_chunks
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with flight.cond:
+                flight.consumers -= 1
+                abandoned = flight.consumers == 0 and not flight.done
+                if abandoned:
+                    flight.cancelled = True
+            if abandoned:
+                self._forget(key, flight)
+
+    def _forget(self, key: str, flight: _Flight):
+        with self._flights_lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _run(self, key: str, flight: _Flight, prompt: str, priority: int):
+        priority_name = "interactive" if priority <= INTERACTIVE else "background"
+        error = None
+        try:
+            queued = time.perf_counter()
+            self.gate.acquire(priority, self.queue_timeout)
+            telemetry.observe("llm_queue_seconds", time.perf_counter() - queued, priority=priority_name)
+            try:
+                if not flight.cancelled:
+                    with telemetry.span("llm_request", priority=priority_name) as span:
+                        span["attempts"] = self._generate(flight, prompt)
+            finally:
+                self.gate.release()
+        except LLMBusy as e:
+            telemetry.inc("llm_rejected_total", priority=priority_name)
+            error = e
+        except Exception as e:
+            error = e
+        finally:
+            self._forget(key, flight)
+            with flight.cond:
+                flight.error = error
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _generate(self, flight: _Flight, prompt: str) -> int:
+        """Run the request, retrying failures that happen before the first chunk; returns the number of attempts."""
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(self.retries + 1):
+            try:
+                self._request(flight, prompt, deadline)
+                return attempt + 1
+            except (requests.ConnectionError, requests.Timeout, _RetryableStatus) as e:
+                remaining = deadline - time.monotonic()
+                if flight.chunks or flight.cancelled or attempt == self.retries or remaining <= 0:
+                    if isinstance(e, requests.Timeout):
+                        raise LLMTimeout(f"Ollama did not answer within {self.timeout}s") from e
+                    raise LLMError(f"Ollama request failed: {e}") from e
+                telemetry.inc("llm_retries_total")
+                # Full jitter, so clients that failed together do not retry together
+                time.sleep(min(remaining, random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))))
+
+    def _request(self, flight: _Flight, prompt: str, deadline: float):
+        payload = {"model": self.model, "prompt": prompt, "stream": True, "options": self.options}
+        read_timeout = max(0.1, deadline - time.monotonic())
+        with self.session.post(self.url, json=payload, stream=True,
+                               timeout=(self.connect_timeout, read_timeout)) as response:
+            if response.status_code in RETRY_STATUSES:
+                raise _RetryableStatus(f"HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise LLMError(f"Ollama returned HTTP {response.status_code}: {response.text[:200]}")
+            for line in response.iter_lines():
+                if flight.cancelled:
+                    return
+                if time.monotonic() > deadline:
+                    raise LLMTimeout(f"Ollama did not finish within {self.timeout}s")
+                if not line:
+                    continue
+                message = json.loads(line)
+                if "error" in message:
+                    raise LLMError(f"Ollama error: {message['error']}")
+                if message.get("response"):
+                    with flight.cond:
+                        flight.chunks.append(message["response"])
+                        flight.cond.notify_all()
+            # Read to the end (past the "done" line) so the connection goes back to the pool
+
+    def close(self):
+        self.session.close()
+
+
+def at_priority(llm, priority: int):
+    """`llm` at the given priority (LLMs without a queue, e.g. benchmark stand-ins, are returned unchanged)."""
+    return llm.with_priority(priority) if hasattr(llm, "with_priority") else llm
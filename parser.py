@@ -3,30 +3,56 @@
 import os
 import ast
 import json
+import hashlib
+import argparse
+import datetime
 import subprocess
 import warnings
+import multiprocessing
+
+import telemetry
+from code_store import PARSED_PATH, STORE_PATH, NDJSONWriter, CodeStore, iter_raw_records, iter_parsed_files
+from call_graph import CALL_GRAPH_PATH, CallGraph
+from summary_generator import OVERVIEW_PATH, build_overview, load_overview, save_overview, manifest_fingerprint
 
 warnings.filterwarnings("ignore")
 
 repo_url = 'https://github.com/himalaya-kaushik/raft-ml-assignment.git'
 clone_dir = repo_url.split('/')[-1].replace('.git', '_codebase')
 
-if not os.path.exists(clone_dir):
-    subprocess.run(['git', 'clone', repo_url, clone_dir])
+# Bump whenever the shape of the parsed output changes so the manifest
+# forces a re-parse of every file.
+PARSER_VERSION = 2
+MANIFEST_PATH = 'parse_manifest.json'
+DIFF_PATH = 'parse_diff.json'
+
+
+def collect_files(clone_dir):
+    """Walk the clone dir and return its python files and README content."""
+    python_files = []
+    readme_content = ""
 
-python_files = []
-readme_content = ""
+    for root, dirs, files in os.walk(clone_dir):
+        for file in files:
+            if file.endswith(".py"):
+                python_files.append(os.path.join(root, file))
+            elif file.lower() == "readme.md":
+                with open(os.path.join(root, file), "r", encoding="utf-8") as readme_file:
+                    readme_content = readme_file.read()
 
-for root, dirs, files in os.walk(clone_dir):
-    for file in files:
-        if file.endswith(".py"):
-            python_files.append(os.path.join(root, file))
-        elif file.lower() == "readme.md":
-            with open(os.path.join(root, file), "r", encoding="utf-8") as readme_file:
-                readme_content = readme_file.read()
+    return sorted(python_files), readme_content
 
 
 class CodeParser(ast.NodeVisitor):
+    """
+    Single-pass visitor: every node is visited exactly once.
+
+    Enclosing functions are kept on a scope stack, so a call or docstring
+    expression is credited to all of them as it is reached instead of
+    re-walking each function body. Code is sliced from raw_lines rather
+    than regenerated with ast.unparse.
+    """
+
     def __init__(self, file_path, raw_lines):
         self.file_path = file_path
         self.raw_lines = raw_lines
@@ -37,6 +63,35 @@ class CodeParser(ast.NodeVisitor):
         self.class_methods = {}
         self.imported_functions = {}
         self.function_references = {}
+        self.function_scopes = []
+        self.qualname_stack = []
+        self._index_comments()
+
+    def _index_comments(self):
+        """
+        Precompute, for every line, the run of '#' comments directly above it.
+
+        comment_spans[i] is a (start, end) slice into self.comment_lines;
+        blank lines and lines opening a triple-quoted string do not break a run.
+        """
+        self.comment_lines = []
+        self.comment_spans = []
+        run_start = 0
+        for line in self.raw_lines:
+            self.comment_spans.append((run_start, len(self.comment_lines)))
+            line = line.strip()
+            if line.startswith('#'):
+                self.comment_lines.append(line[1:].strip())
+            elif line == '' or line.startswith(('"""', "'''")):
+                continue
+            else:
+                run_start = len(self.comment_lines)
+
+    def source_segment(self, node):
+        """Return the original source of a def/class, decorators included."""
+        start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+        end = getattr(node, 'end_lineno', node.lineno)
+        return "\n".join(self.raw_lines[start - 1:end])
 
     def visit_Import(self, node):
         for alias in node.names:
@@ -51,49 +106,66 @@ class CodeParser(ast.NodeVisitor):
         self.generic_visit(node)
 
     def visit_FunctionDef(self, node):
+        self.qualname_stack.append(node.name)
         function_data = {
             "type": "Function",
             "name": f"{self.file_path}::{node.name}",
+            "qualname": ".".join(self.qualname_stack),
             "start_line": node.lineno,
             "end_line": getattr(node, 'end_lineno', node.lineno),
-            "code": ast.unparse(node),
+            "code": self.source_segment(node),
             "docstring": ast.get_docstring(node),
             "calls": [],
             "inline_comments": [],
             "preceding_comments": self.extract_preceding_comments(node.lineno)
         }
 
-        for child in ast.walk(node):
-            if isinstance(child, ast.Call) and isinstance(child.func, ast.Name):
-                function_data["calls"].append(child.func.id)
-                self.function_references.setdefault(child.func.id, []).append(self.file_path)
-            elif isinstance(child, ast.Expr) and isinstance(child.value, ast.Str):
-                function_data["inline_comments"].append(child.value.s)
-
         self.functions_classes.append(function_data)
         self.calls.append({"caller": function_data["name"], "calls": function_data["calls"]})
+
+        self.function_scopes.append(function_data)
         self.generic_visit(node)
+        self.function_scopes.pop()
+        self.qualname_stack.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
 
     def visit_ClassDef(self, node):
+        self.qualname_stack.append(node.name)
         class_data = {
             "type": "Class",
             "name": f"{self.file_path}::{node.name}",
+            "qualname": ".".join(self.qualname_stack),
             "start_line": node.lineno,
             "end_line": getattr(node, 'end_lineno', node.lineno),
             "methods": [],
             "docstring": ast.get_docstring(node),
-            "code": ast.unparse(node),
+            "code": self.source_segment(node),
             "preceding_comments": self.extract_preceding_comments(node.lineno)
         }
 
         for child in node.body:
-            if isinstance(child, ast.FunctionDef):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
                 method_name = f"{node.name}.{child.name}"
                 class_data["methods"].append(method_name)
                 self.class_methods[method_name] = f"{self.file_path}::{node.name}"
 
         self.functions_classes.append(class_data)
         self.generic_visit(node)
+        self.qualname_stack.pop()
+
+    def visit_Call(self, node):
+        if self.function_scopes and isinstance(node.func, ast.Name):
+            for scope in self.function_scopes:
+                scope["calls"].append(node.func.id)
+            self.function_references.setdefault(node.func.id, []).append(self.file_path)
+        self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        if self.function_scopes and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for scope in self.function_scopes:
+                scope["inline_comments"].append(node.value.value)
+        self.generic_visit(node)
 
     def visit_Assign(self, node):
         if isinstance(node.targets[0], ast.Name):
@@ -101,63 +173,233 @@ class CodeParser(ast.NodeVisitor):
         self.generic_visit(node)
 
     def extract_preceding_comments(self, lineno):
-        comments = []
-        for i in range(lineno - 2, -1, -1):
-            line = self.raw_lines[i].strip()
-            if line.startswith('#'):
-                comments.insert(0, line[1:].strip())
-            elif line == '' or line.startswith(('"""', "'''")):
-                continue
-            else:
-                break
-        return comments
+        if lineno < 2:
+            return []
+        start, end = self.comment_spans[lineno - 1]
+        return self.comment_lines[start:end]
 
     def parse(self, content):
-        try:
-            tree = ast.parse(content)
-            self.visit(tree)
-
-            if not self.functions_classes:
-                self.functions_classes.append({
-                    "type": "Script",
-                    "name": f"{self.file_path}",
-                    "start_line": 1,
-                    "end_line": len(content.splitlines()),
-                    "code": content,
-                    "docstring": "",
-                    "calls": [],
-                    "inline_comments": [],
-                    "preceding_comments": self.extract_preceding_comments(1)
-                })
-
-            return {
-                "functions_classes": self.functions_classes,
-                "imports": self.imports,
-                "calls": self.calls,
-                "global_variables": self.global_variables,
-                "class_methods": self.class_methods,
-                "imported_functions": self.imported_functions,
-                "function_references": self.function_references
-            }
-
-        except SyntaxError:
-            return {}
-
-
-parsed_data = {}
-for py_file in python_files:
+        """Parse a module; a SyntaxError propagates so parse_file_safe reports the file as failed."""
+        tree = ast.parse(content)
+        self.visit(tree)
+
+        if not self.functions_classes:
+            self.functions_classes.append({
+                "type": "Script",
+                "name": f"{self.file_path}",
+                "start_line": 1,
+                "end_line": len(content.splitlines()),
+                "code": content,
+                "docstring": "",
+                "calls": [],
+                "inline_comments": [],
+                "preceding_comments": self.extract_preceding_comments(1)
+            })
+
+        return {
+            "functions_classes": self.functions_classes,
+            "imports": self.imports,
+            "calls": self.calls,
+            "global_variables": self.global_variables,
+            "class_methods": self.class_methods,
+            "imported_functions": self.imported_functions,
+            "function_references": self.function_references
+        }
+
+
+def file_hash(path):
+    """Return the sha1 of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Load the per-file manifest written by the previous run."""
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def parse_file(py_file):
+    """Parse a single python file."""
     with open(py_file, 'r', encoding='utf-8') as f:
         content = f.read()
-        raw_lines = content.splitlines()
+        # Split on newlines only so indices line up with ast line numbers
+        # (str.splitlines also breaks on form feeds and other separators).
+        raw_lines = content.split('\n')
     parser = CodeParser(py_file, raw_lines)
-    parsed_data[py_file] = parser.parse(content)
+    return parser.parse(content)
+
+
+def parse_file_safe(py_file):
+    """
+    Worker entry point: parse one file and never raise.
+
+    Unreadable files, encoding errors or pathological inputs (e.g. a
+    RecursionError on deeply nested expressions) are reported per file so
+    one bad file cannot take down a whole worker chunk.
+    """
+    try:
+        return py_file, parse_file(py_file), None
+    except Exception as e:
+        return py_file, {}, f"{type(e).__name__}: {e}"
+
+
+def parse_files(files, workers=1, chunksize=16):
+    """Yield (path, data, error) for every file, in order, using a process pool when workers > 1."""
+    if workers <= 1 or len(files) <= 1:
+        for py_file in files:
+            yield parse_file_safe(py_file)
+        return
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        yield from pool.imap(parse_file_safe, files, chunksize=chunksize)
+
+
+def plan_changes(python_files, manifest):
+    """
+    Compare the files on disk against the manifest.
+
+    mtime and size are checked first; the content hash is only computed
+    when they differ, so an untouched tree costs one stat() per file.
+    Returns (diff, new_manifest) where diff has changed/removed/unchanged lists.
+    """
+    diff = {"changed": [], "removed": [], "unchanged": []}
+    new_manifest = {}
+
+    for py_file in python_files:
+        stat = os.stat(py_file)
+        entry = manifest.get(py_file)
+        current = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "parser_version": PARSER_VERSION
+        }
+
+        if entry and entry.get("parser_version") == PARSER_VERSION:
+            if entry["mtime"] == current["mtime"] and entry["size"] == current["size"]:
+                new_manifest[py_file] = entry
+                diff["unchanged"].append(py_file)
+                continue
+            current["hash"] = file_hash(py_file)
+            if entry.get("hash") == current["hash"]:
+                new_manifest[py_file] = current
+                diff["unchanged"].append(py_file)
+                continue
+        else:
+            current["hash"] = file_hash(py_file)
 
-final_output = {
-    "README": readme_content,
-    "parsed_code": parsed_data
-}
+        new_manifest[py_file] = current
+        diff["changed"].append(py_file)
 
-with open('parsed_code.json', 'w', encoding='utf-8') as json_file:
-    json.dump(final_output, json_file, indent=2)
+    diff["removed"] = sorted(set(manifest) - set(new_manifest))
+    return diff, new_manifest
+
+
+def run(clone_dir, incremental=True, workers=1, chunksize=16,
+        output_path=PARSED_PATH, manifest_path=MANIFEST_PATH, diff_path=DIFF_PATH,
+        call_graph_path=CALL_GRAPH_PATH, overview_path=OVERVIEW_PATH, store_path=STORE_PATH):
+    with telemetry.span("parse", workers=workers, incremental=incremental) as span:
+        diff = _run(clone_dir, incremental, workers, chunksize, output_path, manifest_path,
+                    diff_path, call_graph_path, overview_path, store_path)
+        span.update({k: len(diff[k]) for k in ("changed", "removed", "unchanged", "errors")})
+    telemetry.inc("parsed_files_total", len(diff["changed"]) - len(diff["errors"]))
+    telemetry.inc("parse_errors_total", len(diff["errors"]))
+    return diff
+
+
+def _run(clone_dir, incremental, workers, chunksize, output_path, manifest_path,
+         diff_path, call_graph_path, overview_path, store_path):
+    python_files, readme_content = collect_files(clone_dir)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    has_previous = incremental and os.path.exists(output_path)
+    manifest = load_manifest(manifest_path) if has_previous else {}
+    diff, new_manifest = plan_changes(python_files, manifest)
+    unchanged = set(diff["unchanged"])
+    copied = set()
+    errors = {}
+
+    with NDJSONWriter(output_path) as writer:
+        writer.write_readme(readme_content)
+
+        # Unchanged files are copied through from the previous output line
+        # by line, so neither run ever holds the whole corpus in memory.
+        if unchanged:
+            for file_path, line in iter_raw_records(output_path):
+                if file_path in unchanged:
+                    writer.write_raw(line)
+                    copied.add(file_path)
+
+        # A file listed in the manifest but missing from the previous output
+        # (e.g. the output was deleted by hand) has to be parsed again.
+        missing = unchanged - copied
+        if missing:
+            diff["unchanged"] = [f for f in diff["unchanged"] if f in copied]
+            diff["changed"].extend(sorted(missing))
+
+        for py_file, data, error in parse_files(diff["changed"], workers, chunksize):
+            writer.write_file(py_file, data, error)
+            if error:
+                errors[py_file] = error
+
+    # Files that failed are left out of the manifest, so the next run tries them again
+    for py_file in errors:
+        new_manifest.pop(py_file, None)
+    save_manifest(new_manifest, manifest_path)
+    CodeStore.build(iter_parsed_files(output_path), readme_content, store_path)
+    CallGraph.build(iter_parsed_files(output_path)).save(call_graph_path)
+
+    # The overview only depends on what was parsed, so it is rebuilt only when the manifest changed
+    fingerprint = manifest_fingerprint(new_manifest)
+    overview = load_overview(overview_path)
+    if overview is None or overview.get("fingerprint") != fingerprint:
+        save_overview(build_overview(iter_parsed_files(output_path), fingerprint), overview_path)
+    diff["errors"] = errors
+    with open(diff_path, 'w', encoding='utf-8') as f:
+        json.dump(diff, f, indent=2)
+
+    return diff
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Parse a repository into parsed_code.ndjson")
+    arg_parser.add_argument("--full", action="store_true", help="re-parse every file, ignoring the manifest")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="number of parser processes (1 = parse in this process)")
+    arg_parser.add_argument("--chunksize", type=int, default=16, help="files handed to a worker at a time")
+    arg_parser.add_argument("--shard", help="parse a repository registered with shards.py into its own shard")
+    args = arg_parser.parse_args()
+
+    if args.shard:
+        from shards import ShardRegistry, ensure_checkout
+        registry = ShardRegistry.load()
+        try:
+            shard = registry.get(args.shard)
+        except KeyError as e:
+            raise SystemExit(f"❌ {e.args[0]}")
+        ensure_checkout(shard)
+        source_dir, paths = shard.clone_dir, shard.parser_paths()
+    else:
+        if not os.path.exists(clone_dir):
+            subprocess.run(['git', 'clone', repo_url, clone_dir])
+        source_dir, paths = clone_dir, {}
 
-print(" Parsing complete! All files (including script-only) saved in 'parsed_code.json'")
+    diff = run(source_dir, incremental=not args.full, workers=args.workers, chunksize=args.chunksize, **paths)
+    print(f" Parsing complete! {len(diff['changed'])} changed, {len(diff['removed'])} removed, "
+          f"{len(diff['unchanged'])} unchanged. Saved in '{paths.get('output_path', PARSED_PATH)}'")
+    if args.shard:
+        registry.update(args.shard, files=len(diff["changed"]) + len(diff["unchanged"]),
+                        parsed_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        registry.save()
+    for py_file, error in diff["errors"].items():
+        print(f"⚠️ Failed to parse {py_file}: {error}")
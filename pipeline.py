@@ -0,0 +1,46 @@
+# pipeline.py
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# LangChain, Chroma and the embedding model are synchronous clients, so each
+# stage runs on a worker thread and asyncio only coordinates them. Stages
+# that time out keep running in the background and their result is dropped.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="codebuddy-stage")
+
+
+async def _run_stage(name, fn, timeout):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        value = await asyncio.wait_for(loop.run_in_executor(_executor, fn), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        value, status = None, "timeout"
+    except Exception as e:
+        value, status = None, f"error: {e}"
+    return name, value, {"seconds": round(time.perf_counter() - start, 3), "status": status}
+
+
+async def _run_all(stages: dict, timeouts: dict, parallel: bool):
+    if parallel:
+        return await asyncio.gather(*(
+            _run_stage(name, fn, timeouts.get(name)) for name, fn in stages.items()
+        ))
+    return [await _run_stage(name, fn, timeouts.get(name)) for name, fn in stages.items()]
+
+
+def run_stages(stages: dict, timeouts: dict = None, parallel: bool = True) -> tuple:
+    """
+    Run independent stages ({name: zero-arg callable}) and return (results, timings).
+
+    With parallel=True the stages overlap, so a turn costs the slowest stage
+    instead of the sum; parallel=False runs them one after another (the old
+    behaviour, kept for comparison). A stage that fails or exceeds its
+    timeout in `timeouts` yields None, and timings[name]["status"] says why.
+    """
+    outcome = asyncio.run(_run_all(stages, timeouts or {}, parallel))
+    results = {name: value for name, value, _ in outcome}
+    timings = {name: timing for name, _, timing in outcome}
+    return results, timings
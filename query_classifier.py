@@ -1,8 +1,196 @@
+# query_classifier.py
+#
+# Decides how a question is answered:
+#     symbol      names a function/class: looked up in the symbol table, no vector query
+#     overview    about the whole codebase: answered from the precomputed overview
+#     suggestion  review/refactor request: hybrid retrieval, reviewer prompt
+#     function    anything else about the code: hybrid retrieval (vector + BM25)
+#     chat        needs no code context (greetings, follow-ups, general Python)
+#
+# QueryRouter is a nearest-centroid classifier over the query embedding the
+# chatbot computes for retrieval anyway, so routing costs one small matrix
+# product. Centroids are the mean embeddings of ROUTE_EXAMPLES and are saved
+# in query_router.json, with the embedding model and a hash of the examples
+# so that changing either retrains them. A low-confidence prediction
+# falls back to hybrid retrieval, or to a symbol lookup when the question
+# names an identifier (a name missing from the symbol table is then
+# retrieved the hybrid way).
+
+import os
+import json
+import hashlib
+import numpy as np
+from lexical_index import code_terms
+
+ROUTER_PATH = "query_router.json"
+FALLBACK_ROUTE = "function"
+# Below this cosine similarity, or this margin over the runner-up, the router is not trusted
+MIN_SIMILARITY = 0.2
+MIN_MARGIN = 0.02
+
+ROUTE_EXAMPLES = {
+    "symbol": [
+        "What does `load_config` do?",
+        "Explain CodeParser.parse",
+        "Show me the parse_args function",
+        "Where is visit_ClassDef defined?",
+        "What does the `run` method return?",
+        "Explain Session.close",
+        "What arguments does build_index() take?",
+        "Show the code of get_user_by_id",
+        "What is `MAX_RETRIES` used for?",
+        "Explain the HttpClient class",
+    ],
+    "overview": [
+        "Give me an overview of the codebase",
+        "What is the architecture of this project?",
+        "What does this repository do?",
+        "How are the modules organized?",
+        "Summarize the whole project",
+        "What is the purpose of this codebase?",
+        "Describe the overall structure of the repo",
+        "Which packages make up this project and what do they do?",
+        "Give me a high level tour of the code",
+        "What are the main components of the system?",
+    ],
+    "suggestion": [
+        "How can I improve this function?",
+        "Suggest a refactor for the storage layer",
+        "How would you optimize the report generation?",
+        "Rewrite the parser to be faster",
+        "Are there any code smells in the pricing module?",
+        "What could be simplified in the command line handling?",
+        "Suggest better error handling for file loading",
+        "How should I restructure the models to make them easier to test?",
+        "Review the inventory class and suggest improvements",
+        "Is there a cleaner way to write the tax calculation?",
+    ],
+    "function": [
+        "How does the parser handle syntax errors?",
+        "Where is the configuration loaded?",
+        "How are items saved to disk?",
+        "What happens when a request times out?",
+        "How is the total price calculated?",
+        "Which function validates user input?",
+        "How does the cache decide when an entry is stale?",
+        "Where are database connections opened?",
+        "How is the report formatted before printing?",
+        "What is called when the program starts?",
+    ],
+    "chat": [
+        "Hello!",
+        "Thanks, that helps",
+        "Can you explain that again more simply?",
+        "What did you mean by that?",
+        "Summarize your last answer",
+        "What is a Python decorator?",
+        "What is the difference between a list and a tuple?",
+        "ok great",
+        "Could you say that in fewer words?",
+        "Who are you?",
+    ],
+}
+
+
 def classify_query(query: str) -> str:
+    """Keyword routing, used when no router is available."""
     query = query.lower()
     if any(x in query for x in ["architecture", "overview", "purpose", "structure", "codebase","summary","whole codebase"]):
         return "overview"
     elif any(x in query for x in ["improve", "refactor", "optimize", "suggest", "rewrite"]):
         return "suggestion"
     else:
-        return "function"
\ No newline at end of file
+        return "function"
+
+
+def examples_hash(examples: dict) -> str:
+    """Hash of the route examples, so saved centroids are retrained when they are edited."""
+    return hashlib.sha1(json.dumps(examples, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class QueryRouter:
+    """Nearest-centroid router over query embeddings."""
+
+    def __init__(self, routes: list, centroids, model_name: str = None,
+                 min_similarity: float = MIN_SIMILARITY, min_margin: float = MIN_MARGIN,
+                 examples_hash: str = None):
+        self.routes = list(routes)
+        self.centroids = _normalize(np.asarray(centroids, dtype=np.float32))
+        self.model_name = model_name
+        self.examples_hash = examples_hash
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+
+    @classmethod
+    def train(cls, embedder, model_name: str = None, examples: dict = None) -> "QueryRouter":
+        """Centroid per route from the embedded examples (one batched embedding call)."""
+        examples = examples or ROUTE_EXAMPLES
+        routes = list(examples)
+        texts = [text for route in routes for text in examples[route]]
+        vectors = _normalize(np.asarray(embedder.embed_documents(texts), dtype=np.float32))
+        centroids, start = [], 0
+        for route in routes:
+            end = start + len(examples[route])
+            centroids.append(vectors[start:end].mean(axis=0))
+            start = end
+        return cls(routes, centroids, model_name, examples_hash=examples_hash(examples))
+
+    def route(self, query: str, query_embedding) -> tuple:
+        """Return (route, confidence), falling back to hybrid retrieval when unsure."""
+        embedding = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        similarities = self.centroids @ embedding
+        order = np.argsort(similarities)[::-1]
+        best, runner_up = float(similarities[order[0]]), float(similarities[order[1]])
+        route = self.routes[order[0]]
+        if best < self.min_similarity or best - runner_up < self.min_margin:
+            route = FALLBACK_ROUTE
+        # Whether a question names a symbol is lexical, and embeddings of unseen
+        # identifiers carry little signal: a code question naming one is looked up
+        if route in ("symbol", FALLBACK_ROUTE):
+            route = "symbol" if code_terms(query) else FALLBACK_ROUTE
+        return route, best
+
+    def save(self, path: str = ROUTER_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "examples_hash": self.examples_hash,
+                "routes": self.routes,
+                "centroids": self.centroids.round(6).tolist(),
+                "min_similarity": self.min_similarity,
+                "min_margin": self.min_margin
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = ROUTER_PATH, model_name: str = None, examples: dict = None):
+        """
+        Load saved centroids, or return None if missing, built with another
+        embedding model, or trained on other examples than `examples`
+        (default ROUTE_EXAMPLES).
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if model_name is not None and data.get("model_name") != model_name:
+            return None
+        if data.get("examples_hash") != examples_hash(examples or ROUTE_EXAMPLES):
+            return None
+        return cls(data["routes"], data["centroids"], data.get("model_name"),
+                   data.get("min_similarity", MIN_SIMILARITY), data.get("min_margin", MIN_MARGIN),
+                   data["examples_hash"])
+
+    @classmethod
+    def load_or_train(cls, embedder, model_name: str, path: str = ROUTER_PATH) -> "QueryRouter":
+        router = cls.load(path, model_name)
+        if router is None:
+            router = cls.train(embedder, model_name)
+            router.save(path)
+        return router
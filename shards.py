@@ -0,0 +1,207 @@
+# shards.py
+#
+# One shard per repository: its own parse output, manifest, code store, call
+# graph, overview, lexical index and Chroma collection, listed in a registry.
+#
+#     python shards.py add https://github.com/user/repo.git [--name repo]
+#     python shards.py add ../local/checkout
+#     python shards.py list
+#     python shards.py remove repo
+#
+#     python parser.py --shard repo      # parse into shards/repo/
+#     python chromaDB.py --shard repo    # embed into the codebase_repo collection
+#
+# Without --shard everything keeps using the single default index in the
+# working directory.
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import datetime
+import subprocess
+
+from code_store import PARSED_PATH, STORE_PATH
+from call_graph import CALL_GRAPH_PATH
+from summary_generator import OVERVIEW_PATH
+from lexical_index import LEXICAL_INDEX_PATH
+from ann_index import ANN_INDEX_PATH
+
+SHARDS_DIR = "shards"
+REGISTRY_PATH = os.path.join(SHARDS_DIR, "registry.json")
+CHROMA_PATH = "./chroma_db"
+DEFAULT_COLLECTION = "codebase"
+MANIFEST_NAME = "parse_manifest.json"
+DIFF_NAME = "parse_diff.json"
+
+
+def shard_name(source: str) -> str:
+    """Registry name for a repo URL or path, usable as part of a Chroma collection name."""
+    base = source.rstrip("/").split("/")[-1]
+    base = base[:-4] if base.endswith(".git") else base
+    name = re.sub(r"[^A-Za-z0-9_-]+", "-", base).strip("-_")
+    return name[:50] or "repo"
+
+
+class Shard:
+    """Where one repository's artifacts live. Shard() (no name) is the default single index."""
+
+    def __init__(self, name: str = None, source: str = None, clone_dir: str = None, **info):
+        self.name = name
+        self.source = source
+        self.clone_dir = clone_dir
+        self.info = info
+        self.root = os.path.join(SHARDS_DIR, name) if name else "."
+
+    def path(self, artifact: str) -> str:
+        return os.path.join(self.root, artifact)
+
+    @property
+    def collection_name(self) -> str:
+        return f"{DEFAULT_COLLECTION}_{self.name}" if self.name else DEFAULT_COLLECTION
+
+    @property
+    def diff_path(self) -> str:
+        return self.path(DIFF_NAME)
+
+    @property
+    def store_path(self) -> str:
+        return self.path(STORE_PATH)
+
+    @property
+    def overview_path(self) -> str:
+        return self.path(OVERVIEW_PATH)
+
+    @property
+    def call_graph_path(self) -> str:
+        return self.path(CALL_GRAPH_PATH)
+
+    @property
+    def lexical_index_path(self) -> str:
+        return self.path("lexical_index.json") if self.name else LEXICAL_INDEX_PATH
+
+    @property
+    def ann_index_path(self) -> str:
+        return self.path(ANN_INDEX_PATH)
+
+    def parser_paths(self) -> dict:
+        """Output locations as keyword arguments for parser.run."""
+        return {
+            "output_path": self.path(PARSED_PATH),
+            "manifest_path": self.path(MANIFEST_NAME),
+            "diff_path": self.diff_path,
+            "call_graph_path": self.call_graph_path,
+            "overview_path": self.overview_path,
+            "store_path": self.store_path
+        }
+
+    def to_dict(self) -> dict:
+        return {"source": self.source, "clone_dir": self.clone_dir, **self.info}
+
+
+class ShardRegistry:
+    """name -> shard record, stored as one JSON file."""
+
+    def __init__(self, shards: dict = None, path: str = REGISTRY_PATH):
+        self.shards = shards or {}
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str = REGISTRY_PATH) -> "ShardRegistry":
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({name: Shard(name, **record) for name, record in data.items()}, path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({name: shard.to_dict() for name, shard in sorted(self.shards.items())}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def names(self) -> list:
+        return sorted(self.shards)
+
+    def get(self, name: str) -> Shard:
+        if name not in self.shards:
+            raise KeyError(f"Unknown shard '{name}'. Registered: {', '.join(self.names()) or '(none)'}")
+        return self.shards[name]
+
+    def resolve(self, names) -> list:
+        """Shard names for a selection: a list, a comma-separated string, "all", or empty for the default index."""
+        if not names:
+            return []
+        if isinstance(names, str):
+            names = [n.strip() for n in names.split(",") if n.strip()]
+        if names == ["all"]:
+            return self.names()
+        for name in names:
+            self.get(name)
+        return list(dict.fromkeys(names))
+
+    def add(self, source: str, name: str = None) -> Shard:
+        name = name or shard_name(source)
+        if name in self.shards:
+            raise ValueError(f"Shard '{name}' already exists")
+        if os.path.isdir(source):
+            clone_dir = os.path.abspath(source)
+        else:
+            clone_dir = os.path.join(SHARDS_DIR, name, "repo")
+        shard = Shard(name, source, clone_dir, added_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        self.shards[name] = shard
+        return shard
+
+    def update(self, name: str, **info):
+        self.get(name).info.update(info)
+
+    def remove(self, name: str) -> Shard:
+        return self.shards.pop(self.get(name).name)
+
+
+def ensure_checkout(shard: Shard):
+    """Clone a URL shard on first use (local-path shards are used in place)."""
+    if not os.path.exists(shard.clone_dir):
+        subprocess.run(["git", "clone", shard.source, shard.clone_dir], check=True)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Manage per-repository index shards")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    add_cmd = commands.add_parser("add", help="register a repository (git URL or local path)")
+    add_cmd.add_argument("source")
+    add_cmd.add_argument("--name")
+    commands.add_parser("list", help="show registered shards")
+    remove_cmd = commands.add_parser("remove", help="unregister a shard and delete its index")
+    remove_cmd.add_argument("name")
+    args = arg_parser.parse_args()
+
+    registry = ShardRegistry.load()
+    try:
+        if args.command == "add":
+            shard = registry.add(args.source, args.name)
+            registry.save()
+            print(f"✅ Registered shard '{shard.name}'. Next: python parser.py --shard {shard.name} "
+                  f"&& python chromaDB.py --shard {shard.name}")
+        elif args.command == "list":
+            if not registry.shards:
+                print("No shards registered. Add one with `python shards.py add <repo>`.")
+            for name in registry.names():
+                shard = registry.get(name)
+                print(f"📦 {name}: {shard.source} · {shard.info.get('files', '?')} files, "
+                      f"{shard.info.get('docs', '?')} docs · indexed {shard.info.get('indexed_at', 'never')}")
+        elif args.command == "remove":
+            shard = registry.remove(args.name)
+            registry.save()
+            import chromadb
+            try:
+                chromadb.PersistentClient(path=CHROMA_PATH).delete_collection(shard.collection_name)
+            except Exception:
+                pass  # never indexed
+            shutil.rmtree(shard.root, ignore_errors=True)
+            print(f"🧹 Removed shard '{shard.name}' and its index.")
+    except (KeyError, ValueError) as e:
+        sys.exit(f"❌ {e.args[0]}")
@@ -1,4 +1,10 @@
+import os
 import json
+import hashlib
+from collections import defaultdict
+
+OVERVIEW_PATH = "codebase_overview.json"
+
 def generate_codebase_summary(parsed_data: dict) -> str:
     summary = []
     summary.append("📚 Codebase Overview\n")
@@ -23,3 +29,137 @@ def generate_codebase_summary(parsed_data: dict) -> str:
             summary.append(f"  - [{fc_type}] {name} ({start}-{end})")
 
     return "\n".join(summary)
+
+
+def manifest_fingerprint(manifest: dict) -> str:
+    """Hash of the parse manifest; the overview is rebuilt only when it changes."""
+    return hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def _first_line(text) -> str:
+    return (text or "").strip().split("\n", 1)[0][:120]
+
+
+def build_overview(parsed_files, fingerprint: str = "") -> dict:
+    """
+    Build a package -> file -> symbol overview from (file_path, details) pairs.
+
+    Each level carries a one-line summary, so render_overview can stop at
+    whichever level still fits the prompt.
+    """
+    packages = defaultdict(list)
+    for file_path, details in parsed_files:
+        symbols, classes, functions = [], [], []
+        for item in details.get("functions_classes", []):
+            item_type = item.get("type", "Unknown")
+            if item_type == "Script":
+                symbols.append({"line": f"[Script] top-level code ({item.get('start_line', 1)}-{item.get('end_line', 1)})"})
+                continue
+            name = item.get("qualname") or item.get("name", "").split("::")[-1]
+            doc = _first_line(item.get("docstring"))
+            symbols.append({"line": f"[{item_type}] {name} ({item.get('start_line', '-')}-{item.get('end_line', '-')})"
+                                    + (f": {doc}" if doc else "")})
+            if item_type == "Class":
+                classes.append(name)
+            elif "." not in name:
+                functions.append(name)
+
+        parts = []
+        if classes:
+            parts.append(f"classes: {', '.join(classes[:8])}{' …' if len(classes) > 8 else ''}")
+        if functions:
+            parts.append(f"functions: {', '.join(functions[:8])}{' …' if len(functions) > 8 else ''}")
+        packages[os.path.dirname(file_path) or "."].append({
+            "path": file_path,
+            "line": f"{os.path.basename(file_path)} — {'; '.join(parts) or 'script only'}",
+            "symbols": symbols,
+            "classes": len(classes),
+            "functions": len(functions)
+        })
+
+    overview = {"fingerprint": fingerprint, "packages": []}
+    for name in sorted(packages):
+        files = sorted(packages[name], key=lambda f: f["path"])
+        classes = sum(f["classes"] for f in files)
+        functions = sum(f["functions"] for f in files)
+        overview["packages"].append({
+            "name": name,
+            "line": f"📦 {name}/ — {len(files)} files, {classes} classes, {functions} top-level functions",
+            "files": [{"path": f["path"], "line": f["line"], "symbols": f["symbols"]} for f in files]
+        })
+    return overview
+
+
+def save_overview(overview: dict, path: str = OVERVIEW_PATH):
+    # Written to a temporary file first, so a server reloading it never reads half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(overview, f)
+    os.replace(tmp_path, path)
+
+
+def load_overview(path: str = OVERVIEW_PATH):
+    """Load the precomputed overview, or None if the parser has not written one."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_overview(overview: dict, token_budget: int, count_tokens) -> str:
+    """
+    Render as much of the overview as fits in `token_budget`.
+
+    Levels are added whole and in order (packages, then files, then
+    symbols); the first level that does not fit is filled partially, in
+    tree order, and deeper levels are left out.
+    """
+    header = "📚 Codebase Overview"
+    used = count_tokens(header)
+    included = set()
+
+    levels = [
+        [("p", pi) for pi in range(len(overview["packages"]))],
+        [("f", pi, fi) for pi, p in enumerate(overview["packages"]) for fi in range(len(p["files"]))],
+        [("s", pi, fi, si) for pi, p in enumerate(overview["packages"])
+         for fi, f in enumerate(p["files"]) for si in range(len(f["symbols"]))],
+    ]
+
+    def line_of(node) -> str:
+        package = overview["packages"][node[1]]
+        if node[0] == "p":
+            return package["line"]
+        file = package["files"][node[2]]
+        if node[0] == "f":
+            return "  " + file["line"]
+        return "    - " + file["symbols"][node[3]]["line"]
+
+    for level in levels:
+        complete = True
+        for node in level:
+            cost = count_tokens(line_of(node)) + 1
+            if used + cost > token_budget:
+                complete = False
+                break
+            included.add(node)
+            used += cost
+        if not complete:
+            break
+
+    lines = [header]
+    for pi, package in enumerate(overview["packages"]):
+        if ("p", pi) not in included:
+            continue
+        lines.append(line_of(("p", pi)))
+        for fi, file in enumerate(package["files"]):
+            if ("f", pi, fi) not in included:
+                continue
+            lines.append(line_of(("f", pi, fi)))
+            for si in range(len(file["symbols"])):
+                if ("s", pi, fi, si) in included:
+                    lines.append(line_of(("s", pi, fi, si)))
+
+    omitted = sum(len(level) for level in levels) - len(included)
+    if omitted:
+        lines.append(f"(… {omitted} more entries omitted to fit the context budget)")
+    return "\n".join(lines)
@@ -0,0 +1,35 @@
+# symbols.py
+
+import hashlib
+
+
+def short_name(item: dict) -> str:
+    """Qualified name of a parsed record inside its file (e.g. 'Class.method')."""
+    return item.get("qualname") or item.get("name", "").split("::")[-1]
+
+
+def iter_symbols(file_path: str, details: dict):
+    """
+    Yield (symbol_key, item) for every record of a parsed file.
+
+    The key is file::qualname::type, so it survives line shifts. A name
+    defined twice in the same file (e.g. under if/else) gets a '#n' suffix
+    in source order.
+    """
+    seen = {}
+    for item in details.get("functions_classes", []):
+        key = f"{file_path}::{short_name(item)}::{item.get('type', 'Unknown')}"
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = f"{key}#{seen[key]}"
+        yield key, item
+
+
+def symbol_id(key: str) -> str:
+    """Vector store id for a symbol key."""
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text, stored in metadata to detect changed code."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
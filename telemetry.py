@@ -0,0 +1,270 @@
+# telemetry.py
+#
+# Spans, counters and latency histograms for the parser, indexer and chatbot.
+#
+#     with telemetry.span("retrieve", query_type="function") as span:
+#         ...
+#         span["results"] = len(snippets)
+#     telemetry.inc("cache_hits_total", cache="response")
+#     telemetry.observe("request_seconds", 1.7)
+#
+# Counters and histograms are aggregated in memory (exported as Prometheus
+# text by codebuddy_server.py at /metrics). Span and event records go to a
+# JSONL file through a buffered background writer; `sample_rate` controls
+# which fraction of traces is written (a span inherits its parent's decision).
+
+import os
+import json
+import time
+import atexit
+import bisect
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_PATH = "metrics.jsonl"
+PREFIX = "codebuddy_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class JSONLWriter:
+    """
+    Non-blocking JSONL appender.
+
+    write() only appends the record to an in-memory buffer; a daemon thread
+    serializes and writes it every `flush_interval` seconds (or sooner once
+    `flush_size` records are waiting). When the buffer is full the oldest
+    records are dropped rather than blocking the caller.
+    """
+
+    def __init__(self, path: str = METRICS_PATH, flush_interval: float = 1.0,
+                 flush_size: int = 512, max_buffer: int = 10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.dropped = 0
+        self._buffer = deque(maxlen=max_buffer)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._closed = False
+
+    def write(self, record: dict):
+        if self._thread is None:
+            self._start()
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Resolved now, so a later chdir does not move the file
+            self._file = open(os.path.abspath(self.path), "a", encoding="utf-8")
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._file is None:
+                return
+            lines = []
+            while self._buffer:
+                lines.append(json.dumps(self._buffer.popleft(), ensure_ascii=False, default=str))
+            if lines:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2)
+        self.flush()
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+
+class Histogram:
+    """Fixed-bucket histogram (upper bounds in `buckets`, plus +Inf)."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in key + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Telemetry:
+    def __init__(self, path: str = METRICS_PATH, sample_rate: float = 1.0, enabled: bool = True):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.writer = JSONLWriter(path)
+        self.counters = {}    # (name, label key) -> value
+        self.histograms = {}  # (name, label key) -> Histogram
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, path: str = None, sample_rate: float = None, enabled: bool = None):
+        if path is not None and path != self.writer.path:
+            self.writer.close()
+            self.writer = JSONLWriter(path)
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+        if enabled is not None:
+            self.enabled = enabled
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def _sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time a block: always recorded in the `span_seconds` histogram, and
+        written to the JSONL file when its trace is sampled. Yields the
+        attribute dict so the block can add fields (e.g. result counts).
+        """
+        if not self.enabled:
+            yield attrs
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        sampled = stack[-1][1] if stack else self._sampled()
+        stack.append((name, sampled))
+        status = "ok"
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            self.observe("span_seconds", seconds, span=name)
+            if sampled:
+                self.writer.write({
+                    "ts": round(time.time(), 3),
+                    "type": "span",
+                    "name": name,
+                    "seconds": round(seconds, 6),
+                    "parent": stack[-1][0] if stack else None,
+                    "status": status,
+                    **attrs
+                })
+
+    def event(self, name: str, **fields):
+        """Write a sampled one-off record (e.g. a query and its result count)."""
+        if self.enabled and self._sampled():
+            self.writer.write({"ts": round(time.time(), 3), "type": "event", "name": name, **fields})
+
+    def prometheus_text(self) -> str:
+        """All counters and histograms in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                typed.add(name)
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {round(total, 6)}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self.writer.flush()
+
+
+_default = Telemetry()
+
+
+def configure(path: str = None, sample_rate: float = None, enabled: bool = None):
+    """Change the output file, sampling rate (0..1) or switch telemetry off."""
+    _default.configure(path, sample_rate, enabled)
+
+
+def span(name: str, **attrs):
+    return _default.span(name, **attrs)
+
+
+def inc(name: str, value: float = 1, **labels):
+    _default.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _default.observe(name, value, **labels)
+
+
+def event(name: str, **fields):
+    _default.event(name, **fields)
+
+
+def prometheus_text() -> str:
+    return _default.prometheus_text()
+
+
+def flush():
+    _default.flush()